@@ -1,56 +1,105 @@
 import streamlit as st
 import pandas as pd
 import json
-from sqlalchemy import text
-from datetime import datetime
-from db_utils import engine  
+from datetime import date, timedelta
+from db_utils import query_claims, ensure_schema
+import query_profiler
 
 
 st.title("My Lunch Claims")
+query_profiler.start_rerun("User View")
 
+PAGE_SIZE = 20
+CLAIM_COLUMNS = ["Order Date", "Group Members", "Bill Amount", "Reimbursed Amount", "Status"]
+
+
+def _next_page(next_after):
+    st.session_state["user_claim_cursors"].append(next_after)
+
+def _previous_page():
+    if len(st.session_state["user_claim_cursors"]) > 1:
+        st.session_state["user_claim_cursors"].pop()
+
+
+search_mode = st.radio("Search by", ["Single day", "Date range"], horizontal=True)
 
 with st.form("search_form"):
     emp_id = st.text_input("Enter your Employee ID", max_chars=10)
-    order_date = st.date_input("Select the Order Date")
+    if search_mode == "Single day":
+        order_date = st.date_input("Select the Order Date")
+        date_from, date_to = order_date, order_date
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            date_from = st.date_input("From", value=date.today() - timedelta(days=90))
+        with col2:
+            date_to = st.date_input("To", value=date.today())
     submitted = st.form_submit_button("Search")
 
 if submitted:
     if not emp_id.strip():
         st.warning("Please enter a valid Employee ID.")
+        st.session_state.pop("user_claim_search", None)
+    elif date_to < date_from:
+        st.warning("'To' date cannot be before 'From' date.")
+        st.session_state.pop("user_claim_search", None)
     else:
-        try:
-            order_date_str = order_date.strftime("%Y-%m-%d")
-
-            query = text("""
-            SELECT [Group Members], [Bill Amount], [Reimbursed Amount], [Status]
-            FROM ClaimHistory
-            WHERE [Claimant ID] = :emp_id AND CAST([Order Date] AS DATE) = :order_date
-            """)
-            df = pd.read_sql(query, engine, params={"emp_id": emp_id.strip(), "order_date": order_date_str})
-
-            if df.empty:
-                st.info("No claims found for the given Employee ID and Order Date.")
-            else:
-                if "Group Members" in df.columns:
-                    def format_group(val):
-                        try:
-                            members = json.loads(val)
-                            return "\n".join(f"{m['name']} ({m['id']})" for m in members)
-                        except:
-                            return val
-                    df["Group Members"] = df["Group Members"].apply(format_group)
-
-                
-                df = df.rename(columns={
-                    "Group Members": "Group Members",
-                    "Bill Amount": "Bill Amount (₹)",
-                    "Reimbursed Amount": "Reimbursed (₹)",
-                    "Status": "Current Status"
-                })
-
-                
-                st.subheader("Claim Details")
-                st.dataframe(df, use_container_width=True)
-
-        except Exception as e:
-            st.error(f"Error fetching data: {e}")
+        st.session_state["user_claim_search"] = (emp_id.strip(), date_from, date_to)
+        st.session_state["user_claim_cursors"] = [None]
+
+search = st.session_state.get("user_claim_search")
+if search:
+    search_emp_id, search_from, search_to = search
+    page_cursors = st.session_state["user_claim_cursors"]
+    try:
+        ensure_schema()
+        # [Order Date] >= from AND [Order Date] < to + 1 day, newest first
+        df, next_after = query_claims(
+            claimant_id=search_emp_id,
+            date_from=search_from,
+            date_to=search_to,
+            date_column="Order Date",
+            order_by="Order Date",
+            descending=True,
+            page_size=PAGE_SIZE,
+            after=page_cursors[-1],
+            columns=CLAIM_COLUMNS,
+        )
+
+        if df.empty:
+            st.info("No claims found for the given Employee ID and Order Date(s).")
+        else:
+            df = df[CLAIM_COLUMNS].copy()
+            df["Order Date"] = pd.to_datetime(df["Order Date"]).dt.strftime("%Y-%m-%d")
+            if "Group Members" in df.columns:
+                def format_group(val):
+                    try:
+                        members = json.loads(val)
+                        return "\n".join(f"{m['name']} ({m['id']})" for m in members)
+                    except:
+                        return val
+                df["Group Members"] = df["Group Members"].apply(format_group)
+
+            
+            df = df.rename(columns={
+                "Group Members": "Group Members",
+                "Bill Amount": "Bill Amount (₹)",
+                "Reimbursed Amount": "Reimbursed (₹)",
+                "Status": "Current Status"
+            })
+
+            
+            st.subheader("Claim Details")
+            st.dataframe(df, use_container_width=True)
+
+        if len(page_cursors) > 1 or next_after is not None:
+            nav_prev, nav_page, nav_next = st.columns([1, 2, 1])
+            with nav_prev:
+                st.button("◀ Previous", on_click=_previous_page, disabled=len(page_cursors) <= 1)
+            with nav_page:
+                st.write(f"Page {len(page_cursors)}")
+            with nav_next:
+                st.button("Next ▶", on_click=_next_page, args=(next_after,), disabled=next_after is None)
+
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
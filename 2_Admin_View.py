@@ -3,89 +3,156 @@ import streamlit as st
 import pandas as pd
 import json
 import os
-import base64
-import imghdr
 import time
 from dotenv import load_dotenv
-from st_aggrid import AgGrid, JsCode
-from st_aggrid.grid_options_builder import GridOptionsBuilder
-from st_aggrid import GridUpdateMode
-from db_utils import engine, update_claim_status  
+from db_utils import update_claim_statuses, query_claims, get_pool_stats, CLAIM_SORT_COLUMNS, CLAIM_DATE_COLUMNS
+from employee_directory import get_employee_directory
+from thumbnails import thumbnails_for_bill_files, split_bill_paths
+from claim_snapshot import ClaimSnapshot
+import metrics
+import query_profiler
 
 
 
 st.title("Admin View")
+query_profiler.start_rerun("Admin View")
 
 load_dotenv()
 
 
+def _next_page(next_after):
+    st.session_state["admin_page_cursors"].append(next_after)
+
+def _previous_page():
+    if len(st.session_state["admin_page_cursors"]) > 1:
+        st.session_state["admin_page_cursors"].pop()
+
+
+def _render_bill_images(bill_number, path_str):
+    paths = [p for p in split_bill_paths(path_str) if os.path.exists(p)]
+    if not paths:
+        st.info("No bill images found on disk.")
+    for path in paths:
+        st.image(path, caption=os.path.basename(path))
+
+_dialog = getattr(st, "dialog", None) or getattr(st, "experimental_dialog", None)
+if _dialog is not None:
+    show_bill_images = _dialog("Bill Images", width="large")(_render_bill_images)
+else:
+    def show_bill_images(bill_number, path_str):
+        with st.expander(f"Bill Images ({bill_number})", expanded=True):
+            _render_bill_images(bill_number, path_str)
+
+
+@metrics.span("admin.format_claims")
+def format_claims(df):
+    """
+    Display formatting for raw ClaimHistory rows: dates, group members,
+    JSON columns and bill thumbnails.
+    """
+    for date_col in ["Order Date", "Claim Date"]:
+        if date_col in df.columns:
+            df[date_col] = pd.to_datetime(df[date_col]).dt.strftime("%Y-%m-%d")
+
+    def format_json_column(value):
+        try:
+            parsed = json.loads(value)
+            return json.dumps(parsed, indent=2)
+        except:
+            return value
+
+    for col in df.columns:
+        try:
+            if col == "Group Members":
+                def format_group_members(val):
+                    try:
+                        members = json.loads(val)
+                        return ", ".join(f"{m['name']} ({m['id']})" for m in members)
+                    except:
+                        return val
+                df[col] = df[col].apply(format_group_members)
+            elif df[col].astype(str).str.startswith("[{").any():
+                df[col] = df[col].apply(format_json_column)
+        except Exception:
+            pass
+
+    # small cached thumbnails only; full images are read when an admin opens them
+    if "Bill File" in df.columns:
+        df["Bill_File_DataURI"] = df["Bill File"].astype(str).apply(thumbnails_for_bill_files)
+    else:
+        df["Bill_File_DataURI"] = ""
+    return df
+
+
+status_report = st.session_state.pop("admin_status_report", None)
+if status_report:
+    st.success(status_report)
+
 try:
-    query = "SELECT * FROM ClaimHistory"
-    df = pd.read_sql(query, engine)
-    df = df.sort_values(by="Claim Date", ascending=False)
-    
-    # format date columns if present
-    if not df.empty:
-        for date_col in ["Order Date", "Claim Date"]:
-            if date_col in df.columns:
-                df[date_col] = pd.to_datetime(df[date_col]).dt.strftime("%Y-%m-%d")
+    employees = get_employee_directory()
+
+    with st.expander("Filters"):
+        fcol1, fcol2 = st.columns(2)
+        with fcol1:
+            status_filter = st.multiselect("Status", ["Pending", "Approved", "Rejected"])
+            claimant_filter = st.text_input("Claimant ID").strip()
+            project_options = sorted(str(p) for p in employees.df["Project"].dropna().unique())
+            project_filter = st.selectbox(
+                "Project", [""] + project_options, format_func=lambda x: x if x != "" else "All projects"
+            )
+        with fcol2:
+            date_column = st.selectbox("Date field", list(CLAIM_DATE_COLUMNS))
+            date_range = st.date_input("Date range", value=())
+            sort_column = st.selectbox("Sort by", list(CLAIM_SORT_COLUMNS))
+            sort_desc = st.checkbox("Descending", value=True)
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+
+    date_from = date_range[0] if len(date_range) > 0 else None
+    date_to = date_range[1] if len(date_range) > 1 else None
+
+    # Any filter change starts again from the first page
+    filter_key = (
+        tuple(status_filter), claimant_filter, project_filter, date_column,
+        tuple(date_range), sort_column, sort_desc, page_size
+    )
+    if st.session_state.get("admin_filter_key") != filter_key:
+        st.session_state["admin_filter_key"] = filter_key
+        st.session_state["admin_page_cursors"] = [None]
+    page_cursors = st.session_state["admin_page_cursors"]
+
+    if "claim_snapshot" not in st.session_state:
+        st.session_state["claim_snapshot"] = ClaimSnapshot()
+    snapshot = st.session_state["claim_snapshot"]
+    if st.button("Reload from database"):
+        snapshot.invalidate()
+
+    df, next_after = snapshot.get_page(
+        (filter_key, page_cursors[-1]),
+        lambda: query_claims(
+            statuses=status_filter,
+            date_from=date_from,
+            date_to=date_to,
+            date_column=date_column,
+            claimant_id=claimant_filter or None,
+            project=project_filter or None,
+            order_by=sort_column,
+            descending=sort_desc,
+            page_size=page_size,
+            after=page_cursors[-1],
+        ),
+        format_claims,
+        statuses=status_filter,
+    )
 
     if df.empty:
-        st.info("No claims have been submitted yet.")
+        if len(page_cursors) > 1:
+            st.button("◀ Previous", on_click=_previous_page)
+        st.info("No claims match the selected filters.")
 
     if not df.empty:
-        def format_json_column(value):
-            try:
-                parsed = json.loads(value)
-                return json.dumps(parsed, indent=2)
-            except:
-                return value
-
-        for col in df.columns:
-            try:
-                if col == "Group Members":
-                    def format_group_members(val):
-                        try:
-                            members = json.loads(val)
-                            return ", ".join(f"{m['name']} ({m['id']})" for m in members)
-                        except:
-                            return val
-                    df[col] = df[col].apply(format_group_members)
-                elif df[col].astype(str).str.startswith("[{").any():
-                    df[col] = df[col].apply(format_json_column)
-            except Exception:
-                pass
-
-
-        # prepare base64 image data (do not show original Bill File path later)
-        if "Bill File" in df.columns:
-            def make_data_uri_or_empty(path_str):
-                try:
-                    image_tags = []
-                    if not path_str or path_str.strip().upper() in ("N/A", "NONE", ""):
-                        return ""
-
-                    paths = [p.strip().replace("\\", "/") for p in path_str.split(",")]
-
-                    for p in paths:
-                        full_path = os.path.join(os.getcwd(), p) if not os.path.isabs(p) else p
-                        if os.path.exists(full_path):
-                            with open(full_path, "rb") as f:
-                                data = f.read()
-                            kind = imghdr.what(None, h=data) or "jpeg"
-                            b64 = base64.b64encode(data).decode("utf-8")
-                            uri = f"data:image/{kind};base64,{b64}"
-                            image_tags.append(uri)
-
-                    # Join multiple base64 URIs with pipe `|` separator
-                    return "|".join(image_tags)
-                except Exception:
-                    return ""
-
-
-            df["Bill_File_DataURI"] = df["Bill File"].astype(str).apply(make_data_uri_or_empty)
-        else:
-            df["Bill_File_DataURI"] = ""
+        # st_aggrid is only imported when there is a grid to show
+        from st_aggrid import AgGrid, JsCode, GridUpdateMode
+        from st_aggrid.grid_options_builder import GridOptionsBuilder
 
         display_df = df.copy()
 
@@ -102,6 +169,7 @@ try:
 
         if "Bill File" in display_df.columns:
             display_df = display_df.drop(columns=["Bill File"])
+        display_df = display_df.drop(columns=[c for c in ("Last Modified", "Claim ID") if c in display_df.columns])
         display_df = display_df.rename(columns={"Bill_File_DataURI": "Bill Image"})
 
         orig_cols = list(df.columns)
@@ -120,11 +188,10 @@ try:
                 cols.append(_col)
         display_df = display_df[cols]
 
-        # JS renderer: image thumbnail
-        render_image_modal = JsCode("""
+        # JS renderer: image thumbnails (full size opens via "View Bill Images")
+        render_thumbnails = JsCode("""
         class ImgCellRenderer {
             init(params) {
-                this.params = params;
                 const allURIs = (params.value || '').split('|').filter(x => x);
                 const span = document.createElement('span');
 
@@ -134,133 +201,12 @@ try:
                     return;
                 }
 
-                const modal = document.createElement('div');
-                modal.style.position = 'fixed';
-                modal.style.top = '0';
-                modal.style.left = '0';
-                modal.style.width = '100%';
-                modal.style.height = '100%';
-                modal.style.backgroundColor = 'rgba(0,0,0,0.7)';
-                modal.style.display = 'none';
-                modal.style.alignItems = 'center';
-                modal.style.justifyContent = 'center';
-                modal.style.zIndex = '9999';
-                modal.style.flexDirection = 'column';
-
-                const modalImg = document.createElement('img');
-                modalImg.style.maxHeight = '80%';
-                modalImg.style.maxWidth = '80%';
-                modalImg.style.borderRadius = '10px';
-                modalImg.style.transition = 'transform 0.3s ease';
-                modalImg.style.cursor = 'zoom-in';
-
-                const closeBtn = document.createElement('div');
-                closeBtn.textContent = '✖';
-                closeBtn.style.position = 'absolute';
-                closeBtn.style.top = '10px';
-                closeBtn.style.right = '20px';
-                closeBtn.style.fontSize = '24px';
-                closeBtn.style.cursor = 'pointer';
-                closeBtn.style.color = 'black';
-                closeBtn.style.textDecoration = 'none';
-                closeBtn.style.background = 'none';
-
-                closeBtn.onclick = () => {
-                    modal.style.display = 'none';
-                    modalImg.style.transform = 'scale(1)';
-                    modalImg.style.cursor = 'zoom-in';
-                };
-
-                let zoomedIn = false;
-                modalImg.onclick = (e) => {
-                    e.stopPropagation();
-                    zoomedIn = !zoomedIn;
-                    if (zoomedIn) {
-                        modalImg.style.transformOrigin = `${e.offsetX}px ${e.offsetY}px`;
-                        modalImg.style.transform = 'scale(2.5)';
-                        modalImg.style.cursor = 'zoom-out';
-                    } else {
-                        modalImg.style.transform = 'scale(1)';
-                        modalImg.style.cursor = 'zoom-in';
-                    }
-                };
-
-                const leftBtn = document.createElement('div');
-                leftBtn.textContent = '<';
-                leftBtn.style.position = 'absolute';
-                leftBtn.style.left = '30px';
-                leftBtn.style.top = '50%';
-                leftBtn.style.transform = 'translateY(-50%)';
-                leftBtn.style.fontSize = '36px';
-                leftBtn.style.cursor = 'pointer';
-                leftBtn.style.userSelect = 'none';
-                leftBtn.style.display = 'none';
-                leftBtn.style.color = 'black';
-                leftBtn.style.textDecoration = 'none';
-                leftBtn.style.background = 'none';
-
-                const rightBtn = document.createElement('div');
-                rightBtn.textContent = '>';
-                rightBtn.style.position = 'absolute';
-                rightBtn.style.right = '30px';
-                rightBtn.style.top = '50%';
-                rightBtn.style.transform = 'translateY(-50%)';
-                rightBtn.style.fontSize = '36px';
-                rightBtn.style.cursor = 'pointer';
-                rightBtn.style.userSelect = 'none';
-                rightBtn.style.display = 'none';
-                rightBtn.style.color = 'black';
-                rightBtn.style.textDecoration = 'none';
-                rightBtn.style.background = 'none';
-
-                let currentIndex = 0;
-
-                const updateImage = () => {
-                    modalImg.src = allURIs[currentIndex];
-                    zoomedIn = false;
-                    modalImg.style.transform = 'scale(1)';
-                    modalImg.style.cursor = 'zoom-in';
-                    leftBtn.style.display = currentIndex > 0 ? 'block' : 'none';
-                    rightBtn.style.display = currentIndex < allURIs.length - 1 ? 'block' : 'none';
-                };
-
-                leftBtn.onclick = (e) => {
-                    e.stopPropagation();
-                    if (currentIndex > 0) {
-                        currentIndex--;
-                        updateImage();
-                    }
-                };
-
-                rightBtn.onclick = (e) => {
-                    e.stopPropagation();
-                    if (currentIndex < allURIs.length - 1) {
-                        currentIndex++;
-                        updateImage();
-                    }
-                };
-
-                modal.appendChild(modalImg);
-                modal.appendChild(closeBtn);
-                modal.appendChild(leftBtn);
-                modal.appendChild(rightBtn);
-                document.body.appendChild(modal);
-
-                allURIs.forEach((uri, index) => {
+                allURIs.forEach((uri) => {
                     const thumb = document.createElement('img');
                     thumb.src = uri;
                     thumb.style.height = '80px';
                     thumb.style.marginRight = '5px';
-                    thumb.style.cursor = 'zoom-in';
                     thumb.style.borderRadius = '5px';
-                    thumb.style.transition = '0.3s';
-
-                    thumb.ondblclick = () => {
-                        currentIndex = index;
-                        updateImage();
-                        modal.style.display = 'flex';
-                    };
-
                     span.appendChild(thumb);
                 });
 
@@ -301,13 +247,13 @@ try:
         """)
 
         gb = GridOptionsBuilder.from_dataframe(display_df)
-        gb.configure_pagination()
         gb.configure_default_column(resizable=True, wrapText=True, autoHeight=True)
         gb.configure_grid_options(onCellValueChanged=mutually_exclusive_js)
         gb.configure_grid_options(getRowStyle=row_coloring_js)
 
         
-        gb.configure_column("Bill Image", cellRenderer=render_image_modal, autoHeight=True, width=100)
+        gb.configure_selection(selection_mode="single")
+        gb.configure_column("Bill Image", cellRenderer=render_thumbnails, autoHeight=True, width=100)
         gb.configure_column("Approve", editable=True, cellRenderer='agCheckboxCellRenderer', width=90)
         gb.configure_column("Reject", editable=True, cellRenderer='agCheckboxCellRenderer', width=90)
 
@@ -318,14 +264,34 @@ try:
             fit_columns_on_grid_load=False,
             enable_enterprise_modules=False,
             allow_unsafe_jscode=True,
-            update_mode=GridUpdateMode.VALUE_CHANGED
+            # selection must rerun the page too, or the bill viewer never sees it
+            update_mode=GridUpdateMode.VALUE_CHANGED | GridUpdateMode.SELECTION_CHANGED
         )
 
+        selected_rows = grid_response.get("selected_rows")
+        if isinstance(selected_rows, pd.DataFrame):
+            selected_rows = selected_rows.to_dict("records")
+        selected_bill = selected_rows[0].get("Bill Number") if selected_rows else None
+        if selected_bill is not None:
+            bill_files = df.loc[df["Bill Number"] == selected_bill, "Bill File"] if "Bill File" in df.columns else []
+            if len(bill_files) and st.button(f"View Bill Images ({selected_bill})"):
+                show_bill_images(selected_bill, bill_files.iloc[0])
+
+        nav_prev, nav_page, nav_next = st.columns([1, 2, 1])
+        with nav_prev:
+            st.button("◀ Previous", on_click=_previous_page, disabled=len(page_cursors) <= 1)
+        with nav_page:
+            st.write(f"Page {len(page_cursors)} · {len(df)} rows")
+        with nav_next:
+            st.button("Next ▶", on_click=_next_page, args=(next_after,), disabled=next_after is None)
+
         if st.button("Apply Status"):
             updated = pd.DataFrame(grid_response.get("data", []))
+            original_status = {}
+            if "Status" in df.columns:
+                original_status = dict(zip(df["Bill Number"].astype(str), df["Status"].astype(str)))
             conflicting = []
-            applied = 0
-            errors = []
+            changes = {}
 
             for _, row in updated.iterrows():
                 bill_number = row.get("Bill Number")
@@ -346,28 +312,75 @@ try:
                 else:
                     new_status = "Pending"
 
-                try:
-                    update_claim_status(str(bill_number), new_status)
-                    applied += 1
-                except Exception as e:
-                    errors.append((bill_number, str(e)))
+                # only rows whose status actually changed are written
+                if original_status.get(str(bill_number), "").lower() != new_status.lower():
+                    changes[str(bill_number)] = new_status
 
             if conflicting:
                 st.warning(f"Skipping rows (both Approve+Reject checked): {', '.join(conflicting)}")
-            if errors:
-                st.error(f"Errors updating rows: {errors}")
-            st.success(f"Applied updates.")
 
-            try:
-                if hasattr(st, "experimental_rerun"):
-                    st.experimental_rerun()
+            if not changes:
+                st.info("No status changes to apply.")
+            else:
+                started = time.perf_counter()
+                try:
+                    applied = update_claim_statuses(changes)
+                except Exception as e:
+                    st.error(f"Errors updating rows: {e}")
                 else:
-                    st.query_params = {"_refresh": str(time.time())}
-            except Exception:
-                st.info("Please refresh the page to see updated statuses.")
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    st.session_state["admin_status_report"] = (
+                        f"Applied updates: {applied} row(s) changed in {elapsed_ms:.0f} ms."
+                    )
+                    try:
+                        rerun = getattr(st, "rerun", None) or getattr(st, "experimental_rerun", None)
+                        if rerun is not None:
+                            rerun()
+                        else:
+                            st.query_params = {"_refresh": str(time.time())}
+                    except Exception:
+                        st.info("Please refresh the page to see updated statuses.")
 
 except Exception as e:
     st.error(f"⚠️ Failed to load claim data from SQL Server.\n\n{e}")
 
 
+# Diagnostics: hot-path latency for this app process (all sessions)
+with st.expander("Diagnostics"):
+    summary = metrics.snapshot()
+    if not summary:
+        st.info("No timings recorded yet.")
+    else:
+        st.dataframe(pd.DataFrame([
+            {"Span": name, "Count": m["count"], "Errors": m["errors"], "Mean (ms)": m["mean_ms"],
+             "p50 (ms)": m["p50_ms"], "p95 (ms)": m["p95_ms"], "Max (ms)": m["max_ms"]}
+            for name, m in summary.items()
+        ]))
+    counters = metrics.counters()
+    if counters:
+        st.caption("Counters")
+        st.json(counters)
+    st.caption("Connection pool")
+    st.json(get_pool_stats())
+    if query_profiler.is_enabled():
+        st.caption("Queries per rerun (most recent last)")
+        st.dataframe(pd.DataFrame(query_profiler.rerun_history()))
+        slow_queries = query_profiler.recent_queries(slow_only=True)
+        st.caption(f"Slow queries (>= {query_profiler.SLOW_QUERY_MS:.0f} ms)")
+        if slow_queries:
+            st.dataframe(pd.DataFrame(slow_queries))
+        else:
+            st.write("None recorded.")
+    else:
+        st.caption("Set QUERY_PROFILING=1 to record per-query timings.")
+    dcol1, dcol2, dcol3 = st.columns(3)
+    with dcol1:
+        st.download_button("Download JSON", metrics.to_json(), file_name="metrics.json", mime="application/json")
+    with dcol2:
+        st.download_button("Download Prometheus", metrics.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+    with dcol3:
+        if st.button("Write metrics file"):
+            st.success(f"Written to {metrics.write_metrics_file()}")
+
+
 
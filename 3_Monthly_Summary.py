@@ -0,0 +1,39 @@
+# monthly_summary_page.py
+import streamlit as st
+from datetime import date
+from claim_summary import load_monthly_summary
+
+
+st.title("Monthly Summary")
+
+this_month = date.today().strftime("%Y-%m")
+col1, col2, col3 = st.columns(3)
+with col1:
+    month_from = st.text_input("From month (YYYY-MM)", value=f"{date.today().year}-01").strip()
+with col2:
+    month_to = st.text_input("To month (YYYY-MM)", value=this_month).strip()
+with col3:
+    group_by = st.selectbox(
+        "Group by", ["both", "project", "manager"],
+        format_func={"both": "Project and manager", "project": "Project", "manager": "Reporting manager"}.get,
+    )
+statuses = st.multiselect("Status", ["Pending", "Approved", "Rejected"], default=["Approved"])
+
+try:
+    summary = load_monthly_summary(month_from or None, month_to or None, group_by, statuses or None)
+except Exception as e:
+    st.error(f"⚠️ Failed to load the monthly summary.\n\n{e}")
+    st.stop()
+
+if summary.empty:
+    st.info("No claims in the selected months.")
+else:
+    totals = summary[["Claims", "Bill Amount", "Reimbursed Amount"]].sum()
+    mcol1, mcol2, mcol3 = st.columns(3)
+    mcol1.metric("Claims", int(totals["Claims"]))
+    mcol2.metric("Bill Amount", f"₹{totals['Bill Amount']:,.2f}")
+    mcol3.metric("Reimbursed", f"₹{totals['Reimbursed Amount']:,.2f}")
+    st.dataframe(summary, hide_index=True)
+    st.download_button(
+        "Download CSV", summary.to_csv(index=False), file_name=f"claim_summary_{month_from}_{month_to}.csv", mime="text/csv"
+    )
@@ -1,20 +1,39 @@
 # Lunch_Reimbursement.py
 
 import streamlit as st
-from st_aggrid import AgGrid
-from st_aggrid.grid_options_builder import GridOptionsBuilder
 import pandas as pd
-from datetime import date, datetime
-import os
+from datetime import date
 from dotenv import load_dotenv
 import json
-from ocr_groq import extract_bill_details_from_image
-from db_utils import load_employee_data, load_claim_history, append_claim_record, check_attendance  # ✅ Updated
+from ocr_jobs import enqueue_bills, get_jobs
+from bill_phash import register_bill, find_similar_claimed
+from bill_store import store_uploaded_bill
+from claim_rules import claim_window_error, amounts_match, parse_bill_date, reimbursable_amount, PER_HEAD_CAP
+from db_utils import append_claim_record, check_attendance_bulk, find_already_claimed
+from employee_directory import get_employee_directory
+from metrics import span
+import query_profiler
 
 
 load_dotenv()
 
+# Seconds between checks of the OCR job queue while bills are processing
+OCR_POLL_SECONDS = 1.0
+
+
+@st.fragment(run_every=OCR_POLL_SECONDS)
+def ocr_progress(job_ids):
+    # Only this fragment reruns while OCR is pending; the whole page
+    # reruns once, when every job has finished
+    jobs = get_jobs(job_ids)
+    pending = [job for job in jobs if job.pending]
+    if not pending:
+        st.rerun()
+    st.info(f"Extracting bill details using Groq... ({len(jobs) - len(pending)}/{len(jobs)} done)")
+
+
 st.title("Lunch Reimbursement Portal")
+query_profiler.start_rerun("Lunch Reimbursement")
 city = st.radio("Where are you located?", ["Chennai", "Bangalore"])
 
 col1, col2 = st.columns(2)
@@ -23,29 +42,29 @@ with col1:
 with col2:
     claim_date = st.date_input("Claim Date", value=date.today())
 
-if claim_date < order_date:
-    st.error("Claim Date cannot be before Order Date.")
-    st.stop()
-elif (claim_date - order_date).days > 15:
-    st.error("You are not eligible as you are claiming after 15 days from the Order Date.")
+window_error = claim_window_error(order_date, claim_date)
+if window_error:
+    st.error(window_error)
     st.stop()
 
-employee_df = load_employee_data()
+employees = get_employee_directory()
 st.write("---")
 st.subheader("Claimant Details")
 
-employee_ids = [""] + employee_df["Employee ID"].tolist()
+# Only the top matches for what has been typed are sent to the browser
+claimant_query = st.text_input("Search your name or Employee ID")
+claimant_matches = employees.search(claimant_query)
 claimant_id = st.selectbox(
-    "Enter your Employee ID", 
-    employee_ids, 
-    index=0, 
-    format_func=lambda x: x if x != "" else "Select Employee ID"
+    "Enter your Employee ID",
+    [""] + claimant_matches,
+    index=1 if claimant_query and claimant_matches else 0,
+    format_func=lambda x: employees.label(x) if x != "" else "Select Employee ID"
 )
 
 if claimant_id == "":
     st.stop()
 
-claimant_row = employee_df[employee_df["Employee ID"] == claimant_id].iloc[0]
+claimant_row = employees.get(claimant_id)
 
 
 claimant_info_pairs = [
@@ -69,26 +88,41 @@ with st.container(height=150):
 st.write("---")
 # Group selection
 st.subheader("Group Members")
-employee_options = [
-    f"{row['Employee Name']} ({row['Employee ID']})" for _, row in employee_df.iterrows()
-]
-default_selection = f"{claimant_row['Employee Name']} ({claimant_id})"
+# The selection is kept in session state because the options (current
+# selection + top search matches) change as the user types
+if st.session_state.get("group_claimant_id") != claimant_id:
+    st.session_state["group_claimant_id"] = claimant_id
+    st.session_state["group_member_ids"] = [claimant_id]
+member_ids = st.session_state["group_member_ids"]
+
+search_col, scope_col = st.columns([3, 1])
+with search_col:
+    member_query = st.text_input("Search employees by name or ID")
+with scope_col:
+    own_project = st.checkbox(f"Only {claimant_row['Project']}", value=False)
+matches = employees.search(member_query, project=claimant_row["Project"] if own_project else None)
+
+employee_options = [employees.label(emp_id) for emp_id in member_ids]
+employee_options += [employees.label(emp_id) for emp_id in matches if emp_id not in member_ids]
 selected_members = st.multiselect(
     "Select all group members who were part of this lunch",
     options=employee_options,
-    default=[default_selection]
+    default=[employees.label(emp_id) for emp_id in member_ids]
 )
+st.session_state["group_member_ids"] = [employees.id_from_label(display) for display in selected_members]
 
 
 group_json = []
 selected_ids = set()
 absent_employees = []
 
-for display in selected_members:
-    emp_id = display.split("(")[-1].strip(")")
-    emp_row = employee_df[employee_df["Employee ID"] == emp_id].iloc[0]
+selected_member_ids = [employees.id_from_label(display) for display in selected_members]
+attendance = check_attendance_bulk(selected_member_ids, order_date.strftime("%Y-%m-%d"))
 
-    is_present = check_attendance(emp_id, order_date.strftime("%Y-%m-%d"))
+for emp_id in selected_member_ids:
+    emp_row = employees.get(emp_id)
+
+    is_present = attendance.get(emp_id, False)
     if not is_present:
         absent_employees.append(emp_row["Employee Name"])
     else:
@@ -104,21 +138,8 @@ if absent_employees:
 
 # Duplicate check
 st.write(f"Total Members Selected: {len(group_json)}")
-already_claimed_names = []
-history_df = load_claim_history()
-
-if not history_df.empty:
-    for _, row in history_df.iterrows():
-        if str(row["Order Date"]).split()[0] == str(order_date):  
-            try:
-                previous_group = json.loads(row["Group Members"].replace("'", '"'))
-                previous_ids = {member["id"] for member in previous_group}
-                overlap = selected_ids & previous_ids
-                for emp_id in overlap:
-                    name = employee_df[employee_df["Employee ID"] == emp_id]["Employee Name"].values[0]
-                    already_claimed_names.append(name)
-            except Exception:
-                pass
+already_claimed_ids = find_already_claimed(selected_ids, order_date.strftime("%Y-%m-%d"))
+already_claimed_names = [employees.name(emp_id) for emp_id in already_claimed_ids]
 
 if already_claimed_names:
     st.error(f"The following employees already claimed for reimbursement on {order_date}: {', '.join(already_claimed_names)}")
@@ -145,30 +166,56 @@ if entered_amount > 0:
             uploaded_files.append(uploaded_file)
 
     if len(uploaded_files) == num_bills:
-        with st.spinner("Extracting bill details using Groq..."):
-            for file in uploaded_files:
-                save_dir = "data/bills"
-                os.makedirs(save_dir, exist_ok=True)
-                bill_path = os.path.join(save_dir, file.name)
-                with open(bill_path, "wb") as f:
-                    f.write(file.getbuffer())
-
-                extracted = extract_bill_details_from_image(file)
-                if extracted:
-                    extracted_amount = float(extracted.get("total", 0.0))
-                    bill_data_list.append(extracted)
-                    temp_df = pd.concat([temp_df, pd.DataFrame([{
-                        "filename": file.name,
-                        "cost": extracted_amount,
-                        "date": extracted.get("date", ""),
-                        "restaurant": extracted.get("restaurant_name", "N/A")
-                    }])], ignore_index=True)
-                else:
-                    st.error(f"Could not extract data from {file.name}")
-                    st.stop()
+        # each bill is written once to the content-addressed store and queued
+        # for OCR; the page polls the job queue instead of waiting on the model
+        upload_key = tuple(file.file_id for file in uploaded_files)
+        if st.session_state.get("stored_bills_key") != upload_key:
+            st.session_state["stored_bills_key"] = upload_key
+            st.session_state["stored_bills"] = [store_uploaded_bill(file) for file in uploaded_files]
+        stored_bills = st.session_state["stored_bills"]
+        ocr_job_key = tuple(bill.digest for bill in stored_bills)
+        if st.session_state.get("ocr_job_key") != ocr_job_key:
+            st.session_state["ocr_job_key"] = ocr_job_key
+            st.session_state["ocr_job_ids"] = enqueue_bills(stored_bills)
+            # while OCR runs, compare the images with bills already claimed
+            suspects = []
+            try:
+                with span("bill.phash"):
+                    for bill in stored_bills:
+                        for match in find_similar_claimed(register_bill(bill)):
+                            suspects.append((bill.name, match))
+            except Exception as e:
+                print("Bill hash check error:", e)
+            st.session_state["bill_suspects"] = suspects
+        jobs = get_jobs(st.session_state["ocr_job_ids"])
+
+        if any(job.pending for job in jobs):
+            ocr_progress(st.session_state["ocr_job_ids"])
+            st.stop()
+
+        failed = [bill.name for bill, job in zip(stored_bills, jobs) if not job.data]
+        if failed:
+            st.session_state.pop("ocr_job_key", None)
+            st.error(f"Could not extract data from {', '.join(failed)}")
+            st.stop()
+
+        for bill, job in zip(stored_bills, jobs):
+            extracted = job.data
+            extracted_amount = float(extracted.get("total", 0.0))
+            bill_data_list.append(extracted)
+            temp_df = pd.concat([temp_df, pd.DataFrame([{
+                "filename": bill.name,
+                "cost": extracted_amount,
+                "date": extracted.get("date", ""),
+                "restaurant": extracted.get("restaurant_name", "N/A")
+            }])], ignore_index=True)
+
+        for bill_name, match in st.session_state.get("bill_suspects", []):
+            how = "is identical to" if match.distance == 0 else "looks very similar to"
+            st.warning(f"{bill_name} {how} a bill already claimed under Bill Number {match.bill_number}.")
 
         agg_bill = temp_df["cost"].sum()
-        if abs(entered_amount - agg_bill) < 1.0:
+        if amounts_match(entered_amount, agg_bill):
             st.success(f"Bill amounts match! Entered: ₹{entered_amount:.2f}, Extracted Total: ₹{agg_bill:.2f}")
         else:
             st.error(f"Total bill amount mismatch.\n\nEntered: ₹{entered_amount:.2f}, Extracted: ₹{agg_bill:.2f}")
@@ -177,24 +224,7 @@ if entered_amount > 0:
         # Validate all extracted dates
         for idx, row in temp_df.iterrows():
             date_str = str(row["date"]).strip()
-            parsed_date = None
-
-           
-            possible_formats = [
-                "%Y-%m-%d", "%d-%m-%Y", "%m-%d-%Y",
-                "%Y/%m/%d", "%d/%m/%Y", "%m/%d/%Y",
-                "%d/%m/%y", "%m/%d/%y", "%y/%m/%d", "%y-%m-%d"
-            ]
-
-            for fmt in possible_formats:
-                try:
-                    dt = datetime.strptime(date_str, fmt)
-                    if dt.year < 100:
-                        dt = dt.replace(year=2000 + dt.year)
-                    parsed_date = dt.date()
-                    break
-                except ValueError:
-                    continue
+            parsed_date = parse_bill_date(date_str)
 
             if parsed_date is None or parsed_date != order_date:
                 formatted_order_date = order_date.strftime('%Y/%m/%d')
@@ -211,6 +241,10 @@ if entered_amount > 0:
             "cost": "Cost"
         })
 
+        # st_aggrid is only needed once a bill has been read
+        from st_aggrid import AgGrid
+        from st_aggrid.grid_options_builder import GridOptionsBuilder
+
         gb = GridOptionsBuilder.from_dataframe(display_df)
         gb.configure_default_column(editable=False, resizable=True, wrapText=True, autoHeight=True)
 
@@ -232,7 +266,7 @@ if entered_amount > 0:
         # Use aggregate data for reimbursement
         bill_data = bill_data_list[0] if bill_data_list else None  
         bill_data["total"] = agg_bill
-        bill_file_path = ", ".join([os.path.join("data/bills", f.name) for f in uploaded_files])
+        bill_file_path = ", ".join(bill.path for bill in stored_bills)
 
     else:
         st.info("Please upload all selected number of bills.")
@@ -243,8 +277,8 @@ st.write("---")
 st.subheader("Reimbursement Calculation")
 bill_amount = bill_data.get("total", 0.0) if bill_data else 0.0
 num_people = len(group_json)
-max_allowed = num_people * 400
-reimbursed_amount = min(bill_amount, max_allowed)
+max_allowed = num_people * PER_HEAD_CAP
+reimbursed_amount = reimbursable_amount(bill_amount, num_people)
 
 st.write(f"Total People: {num_people}")
 st.write(f"Maximum Allowable Amount: ₹{max_allowed}")
@@ -269,7 +303,8 @@ claim_data = {
 if  bill_data and bill_data.get("total", 0.0) > 0 and group_json:
     if st.button("Submit Claim"):
         claim_data["Status"] = "Pending"
-        append_claim_record(claim_data)
+        with span("claim.submit"):
+            append_claim_record(claim_data)
         st.success("Claim submitted and recorded successfully!")
         st.info("Request Pending")
 else:
@@ -0,0 +1,88 @@
+# bench_imports.py
+#
+# Cold-start import benchmark for the modules the pages load at the top.
+# Each module is imported in a fresh interpreter several times; the median
+# wall time is reported together with any heavy dependency it pulled in.
+#
+#   python bench_imports.py [--runs 5] [--max-ms 1500] [modules ...]
+#
+# Exits non-zero when a module imports a dependency it should load lazily
+# (LAZY_DEPENDENCIES) or, with --max-ms, when its median exceeds the budget.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Modules imported by the pages, and the heavy packages each must not load
+# at import time (they are created on first use instead)
+LAZY_DEPENDENCIES = {
+    "db_utils": ["sqlalchemy", "pyodbc"],
+    "employee_directory": ["sqlalchemy", "pyodbc"],
+    "claim_snapshot": ["sqlalchemy", "pyodbc"],
+    "ocr_jobs": ["groq", "sqlalchemy", "pyodbc"],
+    "ocr_groq": ["groq", "sqlalchemy", "pyodbc"],
+    "thumbnails": ["sqlalchemy", "groq"],
+    "bill_store": ["sqlalchemy", "groq"],
+    "claim_rules": ["sqlalchemy", "groq"],
+}
+
+HEAVY_MODULES = ["groq", "sqlalchemy", "pyodbc", "st_aggrid", "streamlit", "pandas", "PIL"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int = 5) -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, cwd=here, env=env, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(result["ms"])
+        loaded = result["loaded"]
+    return {"module": module, "median_ms": statistics.median(timings), "loaded": loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of app modules.")
+    parser.add_argument("modules", nargs="*", default=list(LAZY_DEPENDENCIES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="fail if a module's median import time exceeds this")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in args.modules:
+        try:
+            result = measure(module, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<20} import failed:\n{e.stderr}")
+            failures.append(module)
+            continue
+        eager = [m for m in LAZY_DEPENDENCIES.get(module, []) if m in result["loaded"]]
+        print(f"{module:<20} {result['median_ms']:8.1f} ms   loads: {', '.join(result['loaded']) or '-'}")
+        if eager:
+            print(f"{'':<20} imports {', '.join(eager)} eagerly")
+            failures.append(module)
+        if args.max_ms is not None and result["median_ms"] > args.max_ms:
+            print(f"{'':<20} over the {args.max_ms:.0f} ms budget")
+            failures.append(module)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+# bill_phash.py
+#
+# Perceptual-hash index over stored bill images, to catch a receipt that
+# is claimed again after being re-photographed, re-compressed or slightly
+# cropped. Each image gets a 64-bit difference hash (dHash); similar images
+# differ in only a few bits.
+#
+# Lookup uses a banded index: the hash is split into PHASH_BANDS 8-bit
+# bands stored in BillImageHashBands, indexed on (band, value). Two hashes
+# within PHASH_BANDS - 1 bits of each other must agree exactly on at least
+# one band, so one indexed seek per band returns every candidate, which is
+# then filtered by Hamming distance in Python.
+#
+#   python bill_phash.py backfill   index the bills of existing claims
+
+import hashlib
+import io
+import os
+import sys
+from datetime import datetime
+from typing import NamedTuple
+from db_utils import get_connection, ensure_schema
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # without Pillow no perceptual hashes are computed
+    Image = None
+    ImageOps = None
+
+
+PHASH_BANDS = 8  # 64 bits / 8 bits per band; changing it needs a re-index
+# The banded lookup only guarantees matches up to PHASH_BANDS - 1 bits,
+# so larger settings are clamped rather than silently missing candidates
+PHASH_MAX_DISTANCE = min(int(os.getenv("PHASH_MAX_DISTANCE", str(PHASH_BANDS - 1))), PHASH_BANDS - 1)
+
+
+class SimilarBill(NamedTuple):
+    image_sha256: str
+    bill_path: str
+    bill_number: str
+    distance: int
+
+
+def dhash(data: bytes):
+    """
+    64-bit difference hash of an image, or None if it can't be decoded
+    (e.g. PDFs, or Pillow is not installed).
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEG draft mode decodes at a fraction of the size, much faster
+            img.draft("L", (64, 64))
+            small = ImageOps.exif_transpose(img).convert("L").resize((9, 8), Image.LANCZOS)
+    except Exception:
+        return None
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _bands(value: int) -> list:
+    return [(band, (value >> (8 * band)) & 0xFF) for band in range(PHASH_BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    # BIGINT columns are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def digest_from_path(path: str):
+    """
+    The SHA-256 a content-addressed bill_store path is named after, or None.
+    """
+    name = os.path.splitext(os.path.basename(str(path).strip()))[0]
+    return name.lower() if len(name) == 64 and all(c in "0123456789abcdefABCDEF" for c in name) else None
+
+
+def register_bill(stored_bill):
+    """
+    Hash a bill_store.StoredBill and add it to the index (once per
+    content digest). Returns the hash, or None if it can't be hashed.
+    """
+    ensure_schema()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT phash FROM BillImageHashes WHERE image_sha256 = ?", (stored_bill.digest,))
+        row = cursor.fetchone()
+        if row is not None:
+            return _to_unsigned(int(row[0]))
+
+        value = dhash(stored_bill.data)
+        if value is None:
+            return None
+        cursor.execute(
+            "INSERT INTO BillImageHashes (image_sha256, bill_path, phash, created_at) VALUES (?, ?, ?, ?)",
+            (stored_bill.digest, stored_bill.path, _to_signed(value), datetime.now())
+        )
+        cursor.executemany(
+            "INSERT INTO BillImageHashBands ([band], [value], image_sha256) VALUES (?, ?, ?)",
+            [(band, band_value, stored_bill.digest) for band, band_value in _bands(value)]
+        )
+        conn.commit()
+    except Exception as e:
+        # Most likely a concurrent upload of the same image
+        conn.rollback()
+        print("Bill hash index error:", e)
+        return dhash(stored_bill.data)
+    finally:
+        conn.close()
+    return value
+
+
+def find_similar_claimed(value: int, max_distance: int = PHASH_MAX_DISTANCE) -> list:
+    """
+    Bills already attached to a claim whose hash is within max_distance
+    bits of value, closest first. Includes an identical image.
+    max_distance can be at most PHASH_BANDS - 1.
+    """
+    if max_distance > PHASH_BANDS - 1:
+        raise ValueError(f"max_distance must be at most {PHASH_BANDS - 1}, got {max_distance}")
+    if value is None:
+        return []
+    bands = _bands(value)
+    band_sql = " OR ".join("(b.[band] = ? AND b.[value] = ?)" for _ in bands)
+    params = [p for pair in bands for p in pair]
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT DISTINCT h.image_sha256, h.bill_path, h.bill_number, h.phash
+            FROM BillImageHashBands b
+            JOIN BillImageHashes h ON h.image_sha256 = b.image_sha256
+            WHERE ({band_sql}) AND h.bill_number IS NOT NULL
+        """, tuple(params))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    matches = []
+    for digest, path, bill_number, phash in rows:
+        distance = hamming(value, _to_unsigned(int(phash)))
+        if distance <= max_distance:
+            matches.append(SimilarBill(digest, path, bill_number, distance))
+    return sorted(matches, key=lambda m: m.distance)
+
+
+def link_claim_bills(cursor, claims):
+    """
+    Mark the indexed bill images of newly inserted claims as claimed, so
+    later uploads are compared against them. Runs in the caller's
+    transaction; bills that were never indexed are skipped.
+    """
+    rows = [
+        (claim["Bill Number"], digest)
+        for claim in claims
+        for digest in (digest_from_path(p) for p in str(claim.get("Bill File") or "").split(","))
+        if digest
+    ]
+    if rows:
+        cursor.executemany(
+            "UPDATE BillImageHashes SET bill_number = ? WHERE image_sha256 = ? AND bill_number IS NULL", rows
+        )
+
+
+def backfill() -> int:
+    """
+    Index and link the bill images referenced by existing claims.
+    Returns the number of images hashed.
+    """
+    from bill_store import StoredBill
+
+    ensure_schema()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT [Bill Number], [Bill File] FROM ClaimHistory WHERE [Bill File] IS NOT NULL")
+        claims = [{"Bill Number": row[0], "Bill File": row[1]} for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    hashed = 0
+    links = []
+    for claim in claims:
+        for path in str(claim["Bill File"]).split(","):
+            path = path.strip()
+            if not path or not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            # bills saved before bill_store aren't named after their digest
+            digest = digest_from_path(path) or hashlib.sha256(data).hexdigest()
+            if register_bill(StoredBill(os.path.basename(path), path, digest, data, True)) is not None:
+                hashed += 1
+                links.append((claim["Bill Number"], digest))
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        if links:
+            cursor.executemany(
+                "UPDATE BillImageHashes SET bill_number = ? WHERE image_sha256 = ? AND bill_number IS NULL", links
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    return hashed
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else ""
+    if command == "backfill":
+        print(f"Indexed {backfill()} bill images.")
+        return 0
+    print("usage: python bill_phash.py backfill")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,63 @@
+# bill_store.py
+
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple
+
+
+# Root of the content-addressed bill store; files live at
+# <root>/<sha[:2]>/<sha[2:4]>/<sha><ext>
+BILL_STORE_DIR = os.getenv("BILL_STORE_DIR", "data/bills")
+
+_EXTENSIONS = {
+    b"\xff\xd8\xff": ".jpg",
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"%PDF": ".pdf",
+    b"GIF87a": ".gif",
+    b"GIF89a": ".gif",
+}
+
+
+class StoredBill(NamedTuple):
+    name: str          # original upload name, for display only
+    path: str          # path stored in ClaimHistory.[Bill File]
+    digest: str        # SHA-256 of the content
+    data: bytes        # the uploaded buffer, shared with OCR
+    deduplicated: bool # True when identical content was already stored
+
+
+def _extension_for(data: bytes, original_name: str) -> str:
+    for magic, ext in _EXTENSIONS.items():
+        if data.startswith(magic):
+            return ext
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return os.path.splitext(original_name or "")[1].lower()
+
+
+def bill_path_for(digest: str, ext: str = "") -> str:
+    return os.path.join(BILL_STORE_DIR, digest[:2], digest[2:4], f"{digest}{ext}").replace("\\", "/")
+
+
+def store_bill(data: bytes, original_name: str = "") -> StoredBill:
+    """
+    Write an uploaded bill once, under a path derived from its content.
+    Identical uploads resolve to the same file and are not written again.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = bill_path_for(digest, _extension_for(data, original_name))
+    if os.path.exists(path):
+        return StoredBill(original_name, path, digest, data, True)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    # atomic rename, so concurrent uploads of the same bill never see a partial file
+    os.replace(tmp_path, path)
+    return StoredBill(original_name, path, digest, data, False)
+
+
+def store_uploaded_bill(uploaded_file) -> StoredBill:
+    return store_bill(uploaded_file.getvalue(), uploaded_file.name)
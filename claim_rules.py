@@ -0,0 +1,87 @@
+# claim_rules.py
+#
+# Lunch reimbursement rules shared by the claim page and the bulk importer.
+# Scalar helpers serve the interactive page; the *_errors / vectorized
+# helpers work on whole DataFrames of claims at once.
+
+from datetime import datetime
+import pandas as pd
+
+
+CLAIM_WINDOW_DAYS = 15
+AMOUNT_TOLERANCE = 1.0
+PER_HEAD_CAP = 400
+
+BILL_DATE_FORMATS = [
+    "%Y-%m-%d", "%d-%m-%Y", "%m-%d-%Y",
+    "%Y/%m/%d", "%d/%m/%Y", "%m/%d/%Y",
+    "%d/%m/%y", "%m/%d/%y", "%y/%m/%d", "%y-%m-%d"
+]
+
+
+def claim_window_error(order_date, claim_date):
+    """
+    None if the claim is filed within the allowed window, else the reason.
+    """
+    if claim_date < order_date:
+        return "Claim Date cannot be before Order Date."
+    if (claim_date - order_date).days > CLAIM_WINDOW_DAYS:
+        return f"You are not eligible as you are claiming after {CLAIM_WINDOW_DAYS} days from the Order Date."
+    return None
+
+
+def parse_bill_date(value):
+    """
+    Parse an OCR'd bill date in any of BILL_DATE_FORMATS; None if none match.
+    """
+    date_str = str(value).strip()
+    for fmt in BILL_DATE_FORMATS:
+        try:
+            dt = datetime.strptime(date_str, fmt)
+            if dt.year < 100:
+                dt = dt.replace(year=2000 + dt.year)
+            return dt.date()
+        except ValueError:
+            continue
+    return None
+
+
+def amounts_match(entered_amount, extracted_amount) -> bool:
+    return abs(entered_amount - extracted_amount) < AMOUNT_TOLERANCE
+
+
+def reimbursable_amount(bill_amount, num_people):
+    return min(bill_amount, num_people * PER_HEAD_CAP)
+
+
+# ---- vectorized versions -------------------------------------------------
+
+def parse_bill_dates(values: pd.Series) -> pd.Series:
+    """
+    Vectorized parse_bill_date: tries each format over the whole column and
+    keeps the first match per row (NaT where nothing matched).
+    """
+    text = values.astype("string").str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in BILL_DATE_FORMATS:
+        remaining = parsed.isna()
+        if not remaining.any():
+            break
+        parsed[remaining] = pd.to_datetime(text[remaining], format=fmt, errors="coerce")
+    return parsed.dt.normalize()
+
+
+def claim_window_errors(order_dates: pd.Series, claim_dates: pd.Series) -> pd.Series:
+    days = (claim_dates - order_dates).dt.days
+    errors = pd.Series(None, index=order_dates.index, dtype="object")
+    errors[days > CLAIM_WINDOW_DAYS] = f"claimed more than {CLAIM_WINDOW_DAYS} days after the order date"
+    errors[days < 0] = "claim date is before the order date"
+    return errors
+
+
+def amount_mismatch(entered: pd.Series, extracted: pd.Series) -> pd.Series:
+    return (entered - extracted).abs() >= AMOUNT_TOLERANCE
+
+
+def reimbursable_amounts(bill_amounts: pd.Series, member_counts: pd.Series) -> pd.Series:
+    return bill_amounts.clip(upper=member_counts * PER_HEAD_CAP)
@@ -0,0 +1,112 @@
+# claim_snapshot.py
+
+from collections import OrderedDict
+import pandas as pd
+from db_utils import get_claims_watermark, load_claims_modified_since, CLAIM_WATERMARK_OVERLAP
+
+
+class ClaimSnapshot:
+    """
+    Formatted Admin View pages cached per session. Each refresh fetches
+    only the ClaimHistory rows stamped after the last [Last Modified]
+    watermark (minus an overlap window, for transactions that commit
+    after a later stamp was read) and merges them into the cached pages,
+    so a status change does not reload and reformat everything.
+    """
+
+    def __init__(self, max_pages: int = 20, overlap: float = CLAIM_WATERMARK_OVERLAP):
+        self.max_pages = max_pages
+        self.overlap = overlap
+        self.watermark = None
+        self._initialized = False
+        # (Bill Number, stamp) pairs inside the overlap window already merged
+        self._seen = set()
+        # page_key -> (formatted_df, next_after, statuses)
+        self._pages = OrderedDict()
+
+    def invalidate(self):
+        self._pages.clear()
+        self._seen.clear()
+        self._initialized = False
+
+    def _unseen(self, changed):
+        # Drop rows already merged by an earlier refresh and move the watermark
+        stamps = pd.to_datetime(changed["Last Modified"])
+        keys = list(zip(changed["Bill Number"], stamps))
+        fresh = [key not in self._seen for key in keys]
+        newest = stamps.max()
+        if self.watermark is None or newest > self.watermark:
+            self.watermark = newest
+        window_start = self.watermark - pd.Timedelta(seconds=self.overlap)
+        self._seen = {key for key in self._seen.union(keys) if key[1] >= window_start}
+        return changed[fresh]
+
+    def refresh(self, formatter) -> int:
+        """
+        Merge rows changed since the watermark into the cached pages.
+        Returns the number of changed rows seen.
+        """
+        if not self._initialized:
+            watermark = get_claims_watermark()
+            self.watermark = pd.Timestamp(watermark) if watermark is not None else None
+            self._seen.clear()
+            if self.watermark is not None:
+                # rows already in the window are current in the pages loaded next
+                self._unseen(load_claims_modified_since(self.watermark, self.overlap))
+            self._initialized = True
+            return 0
+
+        changed = load_claims_modified_since(self.watermark, self.overlap)
+        if changed.empty:
+            return 0
+        changed = self._unseen(changed)
+        if changed.empty:
+            return 0
+        changed = changed.drop_duplicates(subset="Bill Number", keep="last")
+
+        cached_bills = set()
+        for page_df, _, _ in self._pages.values():
+            cached_bills.update(page_df["Bill Number"])
+        if not set(changed["Bill Number"]) <= cached_bills:
+            # New claims may belong on any page, so cached ordering can't be trusted
+            self._pages.clear()
+            return len(changed)
+
+        new_status = dict(zip(changed["Bill Number"], changed["Status"].astype(str).str.lower()))
+        formatted = formatter(changed.copy()).set_index("Bill Number", drop=False)
+        for key, (page_df, next_after, statuses) in list(self._pages.items()):
+            if statuses:
+                allowed = {str(s).lower() for s in statuses}
+                on_page = set(page_df["Bill Number"])
+                matches = {bill for bill, status in new_status.items() if status in allowed}
+                if (matches - on_page) or ((set(new_status) & on_page) - matches):
+                    # A row moved into or out of this page's status filter
+                    del self._pages[key]
+                    continue
+            hit = page_df["Bill Number"].isin(formatted.index)
+            if not hit.any():
+                continue
+            page_df = page_df.copy()
+            for col in page_df.columns:
+                if col in formatted.columns:
+                    page_df.loc[hit, col] = page_df.loc[hit, "Bill Number"].map(formatted[col])
+            self._pages[key] = (page_df, next_after, statuses)
+        return len(changed)
+
+    def get_page(self, page_key, loader, formatter, statuses=None):
+        """
+        Cached formatted page for page_key, loading it with loader() ->
+        (raw_df, next_after) and formatting it on a miss.
+        """
+        self.refresh(formatter)
+        if page_key in self._pages:
+            self._pages.move_to_end(page_key)
+            page_df, next_after, _ = self._pages[page_key]
+            return page_df.copy(), next_after
+
+        raw_df, next_after = loader()
+        page_df = formatter(raw_df) if not raw_df.empty else raw_df
+        self._pages[page_key] = (page_df, next_after, list(statuses or []))
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return page_df.copy(), next_after
@@ -0,0 +1,234 @@
+# claim_summary.py
+#
+# Monthly reimbursement totals per project and reporting manager, kept in
+# ClaimMonthlySummary so finance reports never scan ClaimHistory. Each row
+# is one (month of Order Date, claimant's project, claimant's reporting
+# manager, status) bucket. db_utils applies deltas in the same transaction
+# as every claim insert and status change; rebuild_monthly_summary()
+# recomputes the table from scratch (e.g. after editing EmployeeMaster).
+#
+#   python claim_summary.py report [--from 2025-01] [--to 2025-12]
+#                                  [--by project|manager|both] [--status Approved]
+#   python claim_summary.py rebuild
+
+import argparse
+import sys
+from collections import defaultdict
+import pandas as pd
+from db_utils import backend, get_connection, ensure_schema, _chunks
+
+
+SUMMARY_KEYS = ["Month", "Project", "Reporting Manager", "Status"]
+SUMMARY_VALUES = ["Claims", "Bill Amount", "Reimbursed Amount"]
+
+
+def _month(order_date) -> str:
+    return str(order_date).split()[0][:7]
+
+
+def _amount(value) -> float:
+    return float(value) if value is not None else 0.0
+
+
+def claimant_details(cursor, claimant_ids) -> dict:
+    """
+    {Employee ID: (Project, Reporting Manager)} for the given claimants.
+    Unknown claimants map to ("", "").
+    """
+    ids = list(dict.fromkeys(str(e) for e in claimant_ids))
+    details = {emp_id: ("", "") for emp_id in ids}
+    for chunk in _chunks(ids):
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"SELECT [Employee ID], [Project], [Reporting Manager] FROM EmployeeMaster "
+            f"WHERE [Employee ID] IN ({placeholders})",
+            tuple(chunk)
+        )
+        for row in cursor.fetchall():
+            details[str(row[0])] = (row[1] or "", row[2] or "")
+    return details
+
+
+def new_claim_deltas(cursor, claims) -> dict:
+    """
+    Summary increments for freshly inserted claims.
+    """
+    details = claimant_details(cursor, [c["Claimant ID"] for c in claims])
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for claim in claims:
+        project, manager = details[str(claim["Claimant ID"])]
+        delta = deltas[(_month(claim["Order Date"]), project, manager, claim.get("Status") or "")]
+        delta[0] += 1
+        delta[1] += _amount(claim["Bill Amount"])
+        delta[2] += _amount(claim["Reimbursed Amount"])
+    return deltas
+
+
+def status_change_deltas(cursor, changes: dict) -> dict:
+    """
+    Summary adjustments for {Bill Number: new Status}, read from
+    ClaimHistory before the UPDATE runs: each affected claim moves from its
+    old status bucket to the new one. The rows are read with
+    backend.locking_read_hint(), so the caller must have called
+    backend.begin_write() on this transaction.
+    """
+    changes = {str(bill): status for bill, status in changes.items()}
+    bills = list(changes)
+    rows = []
+    for chunk in _chunks(bills):
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"SELECT [Bill Number], [Order Date], [Claimant ID], [Status], [Bill Amount], [Reimbursed Amount] "
+            f"FROM ClaimHistory {backend.locking_read_hint()} WHERE [Bill Number] IN ({placeholders})",
+            tuple(chunk)
+        )
+        rows.extend(cursor.fetchall())
+
+    details = claimant_details(cursor, [row[2] for row in rows])
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for bill_number, order_date, claimant_id, old_status, bill_amount, reimbursed in rows:
+        new_status = changes[str(bill_number)]
+        old_status = old_status or ""
+        if old_status == new_status:
+            continue
+        project, manager = details[str(claimant_id)]
+        month = _month(order_date)
+        for status, sign in ((old_status, -1), (new_status, 1)):
+            delta = deltas[(month, project, manager, status)]
+            delta[0] += sign
+            delta[1] += sign * _amount(bill_amount)
+            delta[2] += sign * _amount(reimbursed)
+    return deltas
+
+
+def apply_deltas(cursor, deltas: dict):
+    """
+    Add deltas to ClaimMonthlySummary with one atomic upsert per bucket
+    (backend.upsert_add_sql), so two claims creating the same new bucket
+    at once can't both insert it. Runs inside the caller's transaction.
+    """
+    rows = [
+        (*key, *values)
+        for key, values in deltas.items()
+        if any(value != 0 for value in values)
+    ]
+    if rows:
+        cursor.executemany(
+            backend.upsert_add_sql("ClaimMonthlySummary", SUMMARY_KEYS, SUMMARY_VALUES), rows
+        )
+
+
+def rebuild_summary_rows(cursor, month_sql: str):
+    """
+    Recompute ClaimMonthlySummary with one INSERT ... SELECT over
+    ClaimHistory. month_sql is backend.month_of("c.[Order Date]").
+    """
+    cursor.execute("DELETE FROM ClaimMonthlySummary")
+    cursor.execute(f"""
+        INSERT INTO ClaimMonthlySummary ([Month], [Project], [Reporting Manager], [Status],
+                                         [Claims], [Bill Amount], [Reimbursed Amount])
+        SELECT {month_sql},
+               COALESCE(e.[Project], ''), COALESCE(e.[Reporting Manager], ''), COALESCE(c.[Status], ''),
+               COUNT(*), COALESCE(SUM(c.[Bill Amount]), 0), COALESCE(SUM(c.[Reimbursed Amount]), 0)
+        FROM ClaimHistory c
+        LEFT JOIN EmployeeMaster e ON e.[Employee ID] = c.[Claimant ID]
+        GROUP BY {month_sql},
+                 COALESCE(e.[Project], ''), COALESCE(e.[Reporting Manager], ''), COALESCE(c.[Status], '')
+    """)
+
+
+def rebuild_monthly_summary() -> int:
+    """
+    Recompute the whole summary table; returns the number of buckets.
+    """
+    ensure_schema()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        rebuild_summary_rows(cursor, backend.month_of("c.[Order Date]"))
+        cursor.execute("SELECT COUNT(*) FROM ClaimMonthlySummary")
+        buckets = int(cursor.fetchone()[0])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return buckets
+
+
+def load_monthly_summary(month_from=None, month_to=None, by="both", statuses=None) -> pd.DataFrame:
+    """
+    Totals per month and project and/or reporting manager, read from the
+    summary table only. Months are 'YYYY-MM' strings (inclusive).
+    """
+    group_cols = {
+        "project": ["Project"],
+        "manager": ["Reporting Manager"],
+        "both": ["Project", "Reporting Manager"],
+    }[by]
+    where, params = [], []
+    if month_from:
+        where.append("[Month] >= ?")
+        params.append(month_from)
+    if month_to:
+        where.append("[Month] <= ?")
+        params.append(month_to)
+    if statuses:
+        where.append(f"[Status] IN ({', '.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    select_keys = ", ".join(f"[{col}]" for col in ["Month"] + group_cols)
+
+    ensure_schema()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {select_keys}, SUM([Claims]), SUM([Bill Amount]), SUM([Reimbursed Amount])
+            FROM ClaimMonthlySummary
+            {where_sql}
+            GROUP BY {select_keys}
+            HAVING SUM([Claims]) <> 0
+            ORDER BY {select_keys}
+        """, tuple(params))
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    df = pd.DataFrame([tuple(row) for row in rows], columns=["Month"] + group_cols + SUMMARY_VALUES)
+    df["Claims"] = df["Claims"].astype(int)
+    for col in ["Bill Amount", "Reimbursed Amount"]:
+        df[col] = df[col].astype(float).round(2)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monthly reimbursement totals by project / reporting manager.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="print monthly totals")
+    report.add_argument("--from", dest="month_from", help="first month, YYYY-MM")
+    report.add_argument("--to", dest="month_to", help="last month, YYYY-MM")
+    report.add_argument("--by", choices=["project", "manager", "both"], default="both")
+    report.add_argument("--status", action="append", help="only these statuses (repeatable)")
+    report.add_argument("--csv", help="write the report to this CSV file instead of printing it")
+    sub.add_parser("rebuild", help="recompute the summary table from ClaimHistory")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        print(f"Rebuilt monthly summary: {rebuild_monthly_summary()} buckets.")
+        return 0
+
+    df = load_monthly_summary(args.month_from, args.month_to, args.by, args.status)
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+        print(f"Wrote {len(df)} rows to {args.csv}")
+    elif df.empty:
+        print("No claims in the selected months.")
+    else:
+        print(df.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# db_backends.py
+#
+# Storage backends behind db_utils. Each backend knows how to build the
+# SQLAlchemy URL and engine options for its database, how to prepare a
+# fresh DBAPI connection, and the few bits of SQL that differ between
+# dialects. Pick one with DB_BACKEND=mssql (default) or DB_BACKEND=sqlite.
+
+import os
+
+
+class SqlServerBackend:
+    name = "mssql"
+
+    def __init__(self, server=None, database=None, driver="ODBC Driver 17 for SQL Server"):
+        self.server = server or os.getenv("SQL_SERVER")
+        self.database = database or os.getenv("SQL_DATABASE")
+        self.driver = driver
+
+    def url(self) -> str:
+        driver = self.driver.replace(" ", "+")
+        return f"mssql+pyodbc://@{self.server}/{self.database}?driver={driver}&trusted_connection=yes"
+
+    def engine_options(self) -> dict:
+        # executemany is sent as one batched round trip instead of row by row
+        return {"fast_executemany": True}
+
+    def on_connect(self, dbapi_conn):
+        pass
+
+    def prepare_bulk_cursor(self, cursor):
+        # Raw pyodbc cursors need this set per cursor for batched executemany
+        cursor.fast_executemany = True
+
+    def limit_clauses(self, n: int):
+        return f"TOP ({int(n)})", ""
+
+    def month_of(self, column_sql: str) -> str:
+        # 'YYYY-MM' of a DATE column
+        return f"CONVERT(CHAR(7), {column_sql}, 120)"
+
+    def utc_now_sql(self) -> str:
+        # the database clock, so every app process stamps on the same clock
+        return "SYSUTCDATETIME()"
+
+    def begin_write(self, cursor):
+        # pyodbc connections are already inside a transaction
+        pass
+
+    def locking_read_hint(self) -> str:
+        # rows read before an UPDATE stay locked until the transaction ends
+        return "WITH (UPDLOCK, HOLDLOCK)"
+
+    def upsert_add_sql(self, table: str, key_columns, value_columns) -> str:
+        """
+        Statement that adds the value columns to the row with the given
+        keys, inserting it if missing. Parameters: keys, then values.
+        HOLDLOCK keeps concurrent inserts of the same new key serialized.
+        """
+        source = ", ".join(f"? AS [{col}]" for col in [*key_columns, *value_columns])
+        match = " AND ".join(f"t.[{col}] = s.[{col}]" for col in key_columns)
+        update = ", ".join(f"t.[{col}] = t.[{col}] + s.[{col}]" for col in value_columns)
+        columns = ", ".join(f"[{col}]" for col in [*key_columns, *value_columns])
+        values = ", ".join(f"s.[{col}]" for col in [*key_columns, *value_columns])
+        return (
+            f"MERGE {table} WITH (HOLDLOCK) AS t USING (SELECT {source}) AS s ON {match} "
+            f"WHEN MATCHED THEN UPDATE SET {update} "
+            f"WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values});"
+        )
+
+    def insert_returning_id(self, cursor, table: str, columns, values) -> int:
+        column_sql = ", ".join(f"[{col}]" for col in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        cursor.execute(
+            f"INSERT INTO {table} ({column_sql}) OUTPUT INSERTED.id VALUES ({placeholders})", tuple(values)
+        )
+        return int(cursor.fetchone()[0])
+
+
+class SqliteBackend:
+    """
+    Embedded single-file backend for small offices and for running the
+    app on any machine. Connections are tuned for concurrent readers and
+    a steady stream of small writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SQLITE_PATH", "data/reimbursement.db")
+        # Per-connection cache of compiled (prepared) statements
+        self.statement_cache_size = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+        self.cache_size_kb = int(os.getenv("SQLITE_CACHE_KB", "20000"))
+        self.busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+    def url(self) -> str:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return f"sqlite:///{self.path}"
+
+    def engine_options(self) -> dict:
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                "cached_statements": self.statement_cache_size,
+                "timeout": self.busy_timeout_ms / 1000,
+            }
+        }
+
+    def on_connect(self, dbapi_conn):
+        cursor = dbapi_conn.cursor()
+        try:
+            # WAL lets readers run alongside the single writer
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints; fsync per commit is unnecessary under WAL
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        finally:
+            cursor.close()
+
+    def prepare_bulk_cursor(self, cursor):
+        # sqlite3 already runs executemany as one prepared statement
+        pass
+
+    def limit_clauses(self, n: int):
+        return "", f"LIMIT {int(n)}"
+
+    def month_of(self, column_sql: str) -> str:
+        # dates are stored as 'YYYY-MM-DD...' text
+        return f"substr({column_sql}, 1, 7)"
+
+    def utc_now_sql(self) -> str:
+        # same text format as the stored timestamps, with milliseconds
+        return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+    def begin_write(self, cursor):
+        # sqlite3 only opens a transaction at the first write; take the
+        # write lock up front so reads before an UPDATE can't go stale
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def locking_read_hint(self) -> str:
+        # the database-wide write lock from begin_write covers every row
+        return ""
+
+    def upsert_add_sql(self, table: str, key_columns, value_columns) -> str:
+        # needs SQLite 3.24+; the key columns must be the primary key
+        columns = ", ".join(f"[{col}]" for col in [*key_columns, *value_columns])
+        placeholders = ", ".join("?" for _ in [*key_columns, *value_columns])
+        keys = ", ".join(f"[{col}]" for col in key_columns)
+        update = ", ".join(f"[{col}] = [{col}] + excluded.[{col}]" for col in value_columns)
+        return (
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({keys}) DO UPDATE SET {update}"
+        )
+
+    def insert_returning_id(self, cursor, table: str, columns, values) -> int:
+        column_sql = ", ".join(f"[{col}]" for col in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        cursor.execute(f"INSERT INTO {table} ({column_sql}) VALUES ({placeholders})", tuple(values))
+        return int(cursor.lastrowid)
+
+
+BACKENDS = {
+    SqlServerBackend.name: SqlServerBackend,
+    SqliteBackend.name: SqliteBackend,
+}
+
+
+def get_backend(name: str = None):
+    name = (name or os.getenv("DB_BACKEND", "mssql")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
@@ -0,0 +1,524 @@
+# db_schema.py
+#
+# Versioned schema for the reimbursement database. Works on SQL Server and
+# SQLite; every step is guarded so it can run against a database whose
+# tables were created by hand before this module existed.
+#
+#   python db_schema.py migrate   apply pending migrations
+#   python db_schema.py status    show the current schema version
+#   python db_schema.py check     list hot-path indexes that are missing
+#   python db_schema.py backfill  rebuild ClaimMembers from ClaimHistory
+#   python db_schema.py attendance  list duplicate attendance rows, or add
+#                                   the unique index once there are none
+
+import sys
+from datetime import datetime
+from sqlalchemy import inspect
+from db_utils import get_engine, get_connection
+
+
+def _mssql_table(name, body):
+    return f"IF OBJECT_ID('{name}', 'U') IS NULL CREATE TABLE {name} ({body})"
+
+
+def _mssql_index(name, table, columns, unique=False, include=None):
+    include_sql = f" INCLUDE ({include})" if include else ""
+    return (
+        f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}')) "
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns}){include_sql}"
+    )
+
+
+def _sqlite_table(name, body):
+    return f"CREATE TABLE IF NOT EXISTS {name} ({body})"
+
+
+def _sqlite_index(name, table, columns, unique=False, include=None):
+    # SQLite has no INCLUDE; the key columns alone are indexed
+    return f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+
+
+def _add_last_modified(cursor, dialect):
+    if dialect == "mssql":
+        cursor.execute(
+            "IF COL_LENGTH('ClaimHistory', 'Last Modified') IS NULL "
+            "ALTER TABLE ClaimHistory ADD [Last Modified] DATETIME2 NULL"
+        )
+        return
+    cursor.execute("PRAGMA table_info(ClaimHistory)")
+    if "Last Modified" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE ClaimHistory ADD COLUMN [Last Modified] TIMESTAMP NULL")
+
+
+def _add_claim_id(cursor, dialect):
+    # Unique surrogate key for ClaimHistory; [Bill Number] is free text,
+    # nullable and not unique, so it can't break keyset-pagination ties
+    if dialect == "mssql":
+        cursor.execute(
+            "IF COL_LENGTH('ClaimHistory', 'Claim ID') IS NULL "
+            "ALTER TABLE ClaimHistory ADD [Claim ID] BIGINT IDENTITY(1, 1) NOT NULL"
+        )
+        cursor.execute(_mssql_index("UX_ClaimHistory_ClaimID", "ClaimHistory", "[Claim ID]", unique=True))
+        return
+    # SQLite can't add an autoincrement column; number existing rows and
+    # let a trigger number new ones
+    cursor.execute("PRAGMA table_info(ClaimHistory)")
+    if "Claim ID" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE ClaimHistory ADD COLUMN [Claim ID] INTEGER NULL")
+    cursor.execute("UPDATE ClaimHistory SET [Claim ID] = rowid WHERE [Claim ID] IS NULL")
+    cursor.execute(_sqlite_index("UX_ClaimHistory_ClaimID", "ClaimHistory", "[Claim ID]", unique=True))
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS TR_ClaimHistory_ClaimID AFTER INSERT ON ClaimHistory
+        WHEN NEW.[Claim ID] IS NULL
+        BEGIN
+            UPDATE ClaimHistory SET [Claim ID] = (SELECT COALESCE(MAX([Claim ID]), 0) + 1 FROM ClaimHistory)
+            WHERE rowid = NEW.rowid;
+        END
+    """)
+
+
+def _attendance_duplicates(cursor) -> list:
+    cursor.execute(
+        "SELECT [Employee ID], [Date], COUNT(*) FROM Attendance "
+        "GROUP BY [Employee ID], [Date] HAVING COUNT(*) > 1 ORDER BY [Employee ID], [Date]"
+    )
+    return cursor.fetchall()
+
+
+def _attendance_index(cursor, dialect):
+    # A unique index can't be built over duplicate attendance rows; such a
+    # database gets a plain index so the later migrations still apply.
+    index = _mssql_index if dialect == "mssql" else _sqlite_index
+    duplicates = _attendance_duplicates(cursor)
+    if not duplicates:
+        cursor.execute(index("UX_Attendance_EmployeeID_Date", "Attendance", "[Employee ID], [Date]", unique=True))
+        return
+    print(
+        f"Attendance has {len(duplicates)} duplicated (Employee ID, Date) pairs; "
+        "created a non-unique index instead. Run 'python db_schema.py attendance' to list them."
+    )
+    cursor.execute(index("IX_Attendance_EmployeeID_Date", "Attendance", "[Employee ID], [Date]"))
+
+
+def _backfill_claim_members(cursor, dialect):
+    # Index the members of the claims that already exist
+    from db_utils import fill_claim_members
+
+    fill_claim_members(cursor)
+
+
+def _rebuild_monthly_summary(cursor, dialect):
+    # Backfill the summary from the claims that already exist
+    from claim_summary import rebuild_summary_rows
+    from db_backends import get_backend
+
+    rebuild_summary_rows(cursor, get_backend(dialect).month_of("c.[Order Date]"))
+
+
+# (version, description, {dialect: [SQL string or callable(cursor, dialect)]})
+MIGRATIONS = [
+    (1, "Base tables", {
+        "mssql": [
+            _mssql_table("EmployeeMaster", """
+                [Employee ID] NVARCHAR(50) NOT NULL PRIMARY KEY,
+                [Employee Name] NVARCHAR(200) NOT NULL,
+                [Designation] NVARCHAR(100) NULL,
+                [Project] NVARCHAR(100) NULL,
+                [Reporting Manager] NVARCHAR(200) NULL,
+                [Email] NVARCHAR(200) NULL,
+                [Contact] NVARCHAR(50) NULL
+            """),
+            _mssql_table("Attendance", """
+                [Employee ID] NVARCHAR(50) NOT NULL,
+                [Date] DATE NOT NULL,
+                [Status] NVARCHAR(20) NOT NULL
+            """),
+            _mssql_table("ClaimHistory", """
+                [Order Date] DATE NOT NULL,
+                [Claim Date] DATE NOT NULL,
+                [Claimant ID] NVARCHAR(50) NOT NULL,
+                [Group Members] NVARCHAR(MAX) NULL,
+                [Bill Amount] DECIMAL(12, 2) NULL,
+                [Reimbursed Amount] DECIMAL(12, 2) NULL,
+                [Bill Number] NVARCHAR(100) NULL,
+                [Bill File] NVARCHAR(MAX) NULL,
+                [Status] NVARCHAR(20) NULL
+            """),
+            _mssql_table("OcrExtractedBills", """
+                id INT IDENTITY(1, 1) PRIMARY KEY,
+                restaurant_name NVARCHAR(200) NULL,
+                bill_number NVARCHAR(100) NULL,
+                date NVARCHAR(20) NULL,
+                total DECIMAL(12, 2) NULL
+            """),
+        ],
+        "sqlite": [
+            _sqlite_table("EmployeeMaster", """
+                [Employee ID] TEXT NOT NULL PRIMARY KEY,
+                [Employee Name] TEXT NOT NULL,
+                [Designation] TEXT NULL,
+                [Project] TEXT NULL,
+                [Reporting Manager] TEXT NULL,
+                [Email] TEXT NULL,
+                [Contact] TEXT NULL
+            """),
+            _sqlite_table("Attendance", """
+                [Employee ID] TEXT NOT NULL,
+                [Date] DATE NOT NULL,
+                [Status] TEXT NOT NULL
+            """),
+            _sqlite_table("ClaimHistory", """
+                [Order Date] DATE NOT NULL,
+                [Claim Date] DATE NOT NULL,
+                [Claimant ID] TEXT NOT NULL,
+                [Group Members] TEXT NULL,
+                [Bill Amount] REAL NULL,
+                [Reimbursed Amount] REAL NULL,
+                [Bill Number] TEXT NULL,
+                [Bill File] TEXT NULL,
+                [Status] TEXT NULL
+            """),
+            _sqlite_table("OcrExtractedBills", """
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                restaurant_name TEXT NULL,
+                bill_number TEXT NULL,
+                date TEXT NULL,
+                total REAL NULL
+            """),
+        ],
+    }),
+    (2, "ClaimMembers duplicate-claim index", {
+        "mssql": [
+            _mssql_table("ClaimMembers", """
+                [Order Date] DATE NOT NULL,
+                [Employee ID] NVARCHAR(50) NOT NULL,
+                [Bill Number] NVARCHAR(100) NULL
+            """),
+            _mssql_index("IX_ClaimMembers_OrderDate_EmployeeID", "ClaimMembers", "[Order Date], [Employee ID]"),
+            _backfill_claim_members,
+        ],
+        "sqlite": [
+            _sqlite_table("ClaimMembers", """
+                [Order Date] DATE NOT NULL,
+                [Employee ID] TEXT NOT NULL,
+                [Bill Number] TEXT NULL
+            """),
+            _sqlite_index("IX_ClaimMembers_OrderDate_EmployeeID", "ClaimMembers", "[Order Date], [Employee ID]"),
+            _backfill_claim_members,
+        ],
+    }),
+    (3, "OCR result cache", {
+        "mssql": [
+            _mssql_table("OcrResultCache", """
+                image_sha256 CHAR(64) NOT NULL PRIMARY KEY,
+                result_json NVARCHAR(MAX) NOT NULL,
+                created_at DATETIME2 NOT NULL
+            """),
+        ],
+        "sqlite": [
+            _sqlite_table("OcrResultCache", """
+                image_sha256 TEXT NOT NULL PRIMARY KEY,
+                result_json TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            """),
+        ],
+    }),
+    # [Last Modified] is stamped with the database's UTC clock
+    # (db_backends utc_now_sql), never the app server's
+    (4, "ClaimHistory change watermark (database UTC)", {
+        "mssql": [
+            _add_last_modified,
+            _mssql_index("IX_ClaimHistory_LastModified", "ClaimHistory", "[Last Modified]"),
+        ],
+        "sqlite": [
+            _add_last_modified,
+            _sqlite_index("IX_ClaimHistory_LastModified", "ClaimHistory", "[Last Modified]"),
+        ],
+    }),
+    (5, "Hot-path indexes", {
+        "mssql": [
+            _attendance_index,
+            _mssql_index("IX_ClaimHistory_BillNumber", "ClaimHistory", "[Bill Number]"),
+            _mssql_index(
+                "IX_ClaimHistory_Claimant_OrderDate", "ClaimHistory", "[Claimant ID], [Order Date]",
+                include="[Bill Number], [Group Members], [Bill Amount], [Reimbursed Amount], [Status]",
+            ),
+            _mssql_index("IX_ClaimHistory_ClaimDate", "ClaimHistory", "[Claim Date]"),
+            _mssql_index("IX_OcrExtractedBills_BillNumber", "OcrExtractedBills", "bill_number"),
+        ],
+        "sqlite": [
+            _attendance_index,
+            _sqlite_index("IX_ClaimHistory_BillNumber", "ClaimHistory", "[Bill Number]"),
+            _sqlite_index("IX_ClaimHistory_Claimant_OrderDate", "ClaimHistory", "[Claimant ID], [Order Date], [Bill Number]"),
+            _sqlite_index("IX_ClaimHistory_ClaimDate", "ClaimHistory", "[Claim Date]"),
+            _sqlite_index("IX_OcrExtractedBills_BillNumber", "OcrExtractedBills", "bill_number"),
+        ],
+    }),
+    (6, "Background OCR job queue", {
+        "mssql": [
+            _mssql_table("OcrJobs", """
+                id INT IDENTITY(1, 1) PRIMARY KEY,
+                image_sha256 CHAR(64) NOT NULL,
+                bill_path NVARCHAR(500) NOT NULL,
+                filename NVARCHAR(260) NULL,
+                status NVARCHAR(20) NOT NULL,
+                result_json NVARCHAR(MAX) NULL,
+                error NVARCHAR(MAX) NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                created_at DATETIME2 NOT NULL,
+                updated_at DATETIME2 NOT NULL
+            """),
+            _mssql_index("IX_OcrJobs_Status", "OcrJobs", "status, id"),
+            _mssql_index("IX_OcrJobs_ImageSha", "OcrJobs", "image_sha256"),
+        ],
+        "sqlite": [
+            _sqlite_table("OcrJobs", """
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_sha256 TEXT NOT NULL,
+                bill_path TEXT NOT NULL,
+                filename TEXT NULL,
+                status TEXT NOT NULL,
+                result_json TEXT NULL,
+                error TEXT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP NOT NULL,
+                updated_at TIMESTAMP NOT NULL
+            """),
+            _sqlite_index("IX_OcrJobs_Status", "OcrJobs", "status, id"),
+            _sqlite_index("IX_OcrJobs_ImageSha", "OcrJobs", "image_sha256"),
+        ],
+    }),
+    (7, "Monthly claim summary by project and manager", {
+        "mssql": [
+            _mssql_table("ClaimMonthlySummary", """
+                [Month] CHAR(7) NOT NULL,
+                [Project] NVARCHAR(100) NOT NULL,
+                [Reporting Manager] NVARCHAR(200) NOT NULL,
+                [Status] NVARCHAR(20) NOT NULL,
+                [Claims] INT NOT NULL,
+                [Bill Amount] DECIMAL(14, 2) NOT NULL,
+                [Reimbursed Amount] DECIMAL(14, 2) NOT NULL,
+                PRIMARY KEY ([Month], [Project], [Reporting Manager], [Status])
+            """),
+            _rebuild_monthly_summary,
+        ],
+        "sqlite": [
+            _sqlite_table("ClaimMonthlySummary", """
+                [Month] TEXT NOT NULL,
+                [Project] TEXT NOT NULL,
+                [Reporting Manager] TEXT NOT NULL,
+                [Status] TEXT NOT NULL,
+                [Claims] INTEGER NOT NULL,
+                [Bill Amount] REAL NOT NULL,
+                [Reimbursed Amount] REAL NOT NULL,
+                PRIMARY KEY ([Month], [Project], [Reporting Manager], [Status])
+            """),
+            _rebuild_monthly_summary,
+        ],
+    }),
+    (8, "Perceptual-hash index of bill images", {
+        "mssql": [
+            _mssql_table("BillImageHashes", """
+                image_sha256 CHAR(64) NOT NULL PRIMARY KEY,
+                bill_path NVARCHAR(500) NOT NULL,
+                phash BIGINT NOT NULL,
+                bill_number NVARCHAR(100) NULL,
+                created_at DATETIME2 NOT NULL
+            """),
+            _mssql_table("BillImageHashBands", """
+                [band] TINYINT NOT NULL,
+                [value] TINYINT NOT NULL,
+                image_sha256 CHAR(64) NOT NULL
+            """),
+            _mssql_index("IX_BillImageHashBands_Band_Value", "BillImageHashBands", "[band], [value]",
+                         include="image_sha256"),
+        ],
+        "sqlite": [
+            _sqlite_table("BillImageHashes", """
+                image_sha256 TEXT NOT NULL PRIMARY KEY,
+                bill_path TEXT NOT NULL,
+                phash INTEGER NOT NULL,
+                bill_number TEXT NULL,
+                created_at TIMESTAMP NOT NULL
+            """),
+            _sqlite_table("BillImageHashBands", """
+                [band] INTEGER NOT NULL,
+                [value] INTEGER NOT NULL,
+                image_sha256 TEXT NOT NULL
+            """),
+            _sqlite_index("IX_BillImageHashBands_Band_Value", "BillImageHashBands", "[band], [value], image_sha256"),
+        ],
+    }),
+    (9, "ClaimHistory surrogate key for keyset pagination", {
+        "mssql": [_add_claim_id],
+        "sqlite": [_add_claim_id],
+    }),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# (table, leading columns, unique) for every predicate the app relies on
+EXPECTED_INDEXES = [
+    ("EmployeeMaster", ["Employee ID"], True),
+    ("Attendance", ["Employee ID", "Date"], True),
+    ("ClaimHistory", ["Bill Number"], False),
+    ("ClaimHistory", ["Claimant ID", "Order Date"], False),
+    ("ClaimHistory", ["Claim Date"], False),
+    ("ClaimHistory", ["Last Modified"], False),
+    ("ClaimHistory", ["Claim ID"], True),
+    ("ClaimMembers", ["Order Date", "Employee ID"], False),
+    ("OcrExtractedBills", ["bill_number"], False),
+    ("OcrResultCache", ["image_sha256"], True),
+    ("OcrJobs", ["status"], False),
+    ("OcrJobs", ["image_sha256"], False),
+    ("ClaimMonthlySummary", ["Month"], True),
+    ("BillImageHashes", ["image_sha256"], True),
+    ("BillImageHashBands", ["band", "value"], False),
+]
+
+
+def _ensure_version_table(cursor, dialect):
+    if dialect == "mssql":
+        cursor.execute(_mssql_table("SchemaVersion", """
+            version INT NOT NULL PRIMARY KEY,
+            description NVARCHAR(200) NOT NULL,
+            applied_at DATETIME2 NOT NULL
+        """))
+    else:
+        cursor.execute(_sqlite_table("SchemaVersion", """
+            version INTEGER NOT NULL PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        """))
+
+
+def current_version() -> int:
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        _ensure_version_table(cursor, get_engine().dialect.name)
+        conn.commit()
+        cursor.execute("SELECT MAX(version) FROM SchemaVersion")
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return (row[0] if row else None) or 0
+
+
+def migrate(target: int = None) -> list:
+    """
+    Apply pending migrations up to target (default: latest), each in its
+    own transaction. Returns the versions applied.
+    """
+    dialect = get_engine().dialect.name
+    target = target or SCHEMA_VERSION
+    start = current_version()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= start or version > target:
+            continue
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            for step in steps[dialect]:
+                if callable(step):
+                    step(cursor, dialect)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO SchemaVersion (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        applied.append(version)
+    return applied
+
+
+def unique_attendance_index() -> list:
+    """
+    Create the unique (Employee ID, Date) index on Attendance if there are
+    no duplicate rows; otherwise return the duplicates unchanged.
+    """
+    dialect = get_engine().dialect.name
+    index = _mssql_index if dialect == "mssql" else _sqlite_index
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        duplicates = _attendance_duplicates(cursor)
+        if not duplicates:
+            cursor.execute(index("UX_Attendance_EmployeeID_Date", "Attendance", "[Employee ID], [Date]", unique=True))
+            conn.commit()
+    finally:
+        conn.close()
+    return duplicates
+
+
+def missing_indexes() -> list:
+    """
+    Hot-path (table, columns, unique) entries not served by any existing
+    index, primary key or unique constraint whose leading columns match.
+    """
+    inspector = inspect(get_engine())
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table, columns, unique in EXPECTED_INDEXES:
+        if table not in tables:
+            missing.append((table, columns, unique))
+            continue
+        candidates = []
+        pk = inspector.get_pk_constraint(table).get("constrained_columns") or []
+        if pk:
+            candidates.append((pk, True))
+        for uc in inspector.get_unique_constraints(table):
+            candidates.append((uc["column_names"], True))
+        for ix in inspector.get_indexes(table):
+            candidates.append(([c for c in ix["column_names"] if c], bool(ix.get("unique"))))
+        served = any(
+            cols[:len(columns)] == columns and (is_unique or not unique)
+            for cols, is_unique in candidates
+        )
+        if not served:
+            missing.append((table, columns, unique))
+    return missing
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "status"
+    if command == "migrate":
+        applied = migrate()
+        print(f"Applied migrations: {applied or 'none'}; schema version {current_version()}")
+    elif command == "status":
+        print(f"Schema version {current_version()} (latest {SCHEMA_VERSION})")
+    elif command == "check":
+        missing = missing_indexes()
+        for table, columns, unique in missing:
+            kind = "unique index" if unique else "index"
+            print(f"Missing {kind} on {table} ({', '.join(columns)})")
+        if not missing:
+            print("All expected indexes are present.")
+        return 1 if missing else 0
+    elif command == "attendance":
+        duplicates = unique_attendance_index()
+        for emp_id, day, count in duplicates:
+            print(f"{emp_id} on {day}: {count} rows")
+        if duplicates:
+            print("Remove the duplicates, then run this again to add the unique index.")
+            return 1
+        print("Attendance has a unique (Employee ID, Date) index.")
+    elif command == "backfill":
+        from db_utils import backfill_claim_members
+
+        print(f"Wrote {backfill_claim_members()} ClaimMembers rows.")
+    else:
+        print(f"Unknown command: {command}. Use migrate, status, check, backfill or attendance.")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
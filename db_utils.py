@@ -1,84 +1,552 @@
 # db_utils.py
 
 import pandas as pd
-import pyodbc
 import os
+import json
+import threading
+from datetime import date, timedelta
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from db_backends import get_backend
+from metrics import span
+import query_profiler
 
 
 load_dotenv()
 
-# SQLAlchemy engine for use with pandas.read_sql
-DB_SERVER = os.getenv("SQL_SERVER")
-DB_NAME = os.getenv("SQL_DATABASE")
-engine = create_engine(
-    f"mssql+pyodbc://@{DB_SERVER}/{DB_NAME}?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes"
-)
+# Storage backend (see db_backends): DB_BACKEND=mssql (default) or sqlite
+backend = get_backend()
+DB_BACKEND = backend.name
 
-def get_connection():
-    conn_str = (
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={DB_SERVER};"
-        f"DATABASE={DB_NAME};"
-        f"Trusted_Connection=yes;"
+# Pool settings shared by pandas reads and the raw cursor helpers below
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Run db_schema migrations automatically on first use
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+
+
+def _build_engine():
+    from sqlalchemy import create_engine
+
+    return create_engine(
+        backend.url(),
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,  # health check on every checkout
+        **backend.engine_options(),
     )
-    return pyodbc.connect(conn_str)
 
+
+_engine = None
+_engine_lock = threading.Lock()
+
+_pool_counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidations": 0}
+_pool_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _pool_counters_lock:
+        _pool_counters[name] += 1
+
+
+def _install_listeners(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        backend.on_connect(dbapi_conn)
+        _count("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, connection_record, connection_proxy):
+        _count("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, connection_record):
+        _count("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, connection_record, exception):
+        _count("invalidations")
+
+    query_profiler.install(engine)
+
+
+def get_engine():
+    """
+    The shared SQLAlchemy engine (used with pandas.read_sql), created on
+    first use so importing this module doesn't load the database driver.
+    Its pool is also the source of the connections from get_connection().
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _build_engine()
+                _install_listeners(engine)
+                _engine = engine
+    return _engine
+
+
+def __getattr__(name):
+    # keeps `from db_utils import engine` working without an import-time engine
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_connection():
+    """
+    Check out a DBAPI connection from the shared engine pool.
+    Calling close() on it returns it to the pool instead of disconnecting.
+    """
+    return query_profiler.wrap_connection(get_engine().raw_connection())
+
+def get_pool_stats():
+    """
+    Snapshot of pool usage: current size/occupancy plus lifetime counters.
+    """
+    pool = get_engine().pool
+    stats = {
+        "backend": DB_BACKEND,
+        "pool_class": type(pool).__name__,
+        "configured_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+    }
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    with _pool_counters_lock:
+        stats.update(_pool_counters)
+    return stats
+
+@span("db.load_employee_data")
 def load_employee_data():
-    df = pd.read_sql("SELECT * FROM EmployeeMaster", engine)
+    df = pd.read_sql("SELECT * FROM EmployeeMaster", get_engine())
     return df
 
+@span("db.load_claim_history")
 def load_claim_history():
-    df = pd.read_sql("SELECT * FROM ClaimHistory", engine)
+    df = pd.read_sql("SELECT * FROM ClaimHistory", get_engine())
     return df
 
+# Columns the Admin View may sort or date-filter ClaimHistory by
+CLAIM_SORT_COLUMNS = ("Claim Date", "Order Date", "Bill Amount", "Reimbursed Amount")
+CLAIM_DATE_COLUMNS = ("Claim Date", "Order Date")
+
+
+def _to_python(value):
+    # pandas/numpy scalars -> plain Python values the DBAPI driver accepts
+    if hasattr(value, "to_pydatetime"):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+@span("db.query_claims")
+def query_claims(
+    statuses=None,
+    date_from: date = None,
+    date_to: date = None,
+    date_column: str = "Claim Date",
+    claimant_id: str = None,
+    project: str = None,
+    order_by: str = "Claim Date",
+    descending: bool = True,
+    page_size: int = 50,
+    after=None,
+    columns=None,
+):
+    """
+    Fetch one page of ClaimHistory with filtering, ordering and keyset
+    pagination done by the database.
+
+    date_to is inclusive. after is the (order_by value, Claim ID) pair
+    of the last row of the previous page, or None for the first page;
+    the unique [Claim ID] breaks ties, so rows sharing a sort value (or a
+    Bill Number) are never skipped at a page boundary. NULL amounts sort
+    as -1. columns limits the selected columns (order_by, Bill Number and
+    Claim ID are always included). Returns (page_df, next_after);
+    next_after is None on the last page.
+    """
+    if order_by not in CLAIM_SORT_COLUMNS:
+        raise ValueError(f"Unsupported sort column: {order_by}")
+    if date_column not in CLAIM_DATE_COLUMNS:
+        raise ValueError(f"Unsupported date column: {date_column}")
+
+    where = []
+    params = {}
+    if statuses:
+        names = []
+        for i, status in enumerate(statuses):
+            params[f"status_{i}"] = status
+            names.append(f":status_{i}")
+        where.append(f"[Status] IN ({', '.join(names)})")
+    if date_from:
+        where.append(f"[{date_column}] >= :date_from")
+        params["date_from"] = date_from.strftime("%Y-%m-%d")
+    if date_to:
+        # half-open upper bound keeps the predicate sargable for DATETIME columns
+        where.append(f"[{date_column}] < :date_to")
+        params["date_to"] = (date_to + timedelta(days=1)).strftime("%Y-%m-%d")
+    if claimant_id:
+        where.append("[Claimant ID] = :claimant_id")
+        params["claimant_id"] = claimant_id
+    if project:
+        where.append("[Claimant ID] IN (SELECT [Employee ID] FROM EmployeeMaster WHERE [Project] = :project)")
+        params["project"] = project
+    # date columns are NOT NULL; nullable amounts get a sentinel so the
+    # keyset comparison below never drops NULL rows
+    sort_sql = f"[{order_by}]" if order_by in CLAIM_DATE_COLUMNS else f"COALESCE([{order_by}], -1)"
+    if after is not None:
+        op = "<" if descending else ">"
+        where.append(
+            f"({sort_sql} {op} :after_key OR ({sort_sql} = :after_key AND [Claim ID] {op} :after_id))"
+        )
+        params["after_key"], params["after_id"] = after
+
+    if columns:
+        wanted = list(dict.fromkeys([*columns, order_by, "Bill Number", "Claim ID"]))
+        select_sql = ", ".join(f"[{col}]" for col in wanted)
+    else:
+        select_sql = "*"
+
+    from sqlalchemy import text
+
+    direction = "DESC" if descending else "ASC"
+    top, limit = backend.limit_clauses(page_size + 1)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    query = text(f"""
+        SELECT {top} {select_sql}, {sort_sql} AS [_sort_key] FROM ClaimHistory
+        {where_sql}
+        ORDER BY {sort_sql} {direction}, [Claim ID] {direction}
+        {limit}
+    """)
+    df = pd.read_sql(query, get_engine(), params=params)
+
+    next_after = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        last = df.iloc[-1]
+        next_after = (_to_python(last["_sort_key"]), _to_python(last["Claim ID"]))
+    return df.drop(columns=["_sort_key"]), next_after
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    """
+    Apply pending db_schema migrations once per process (tables and
+    indexes the helpers below rely on). Disabled with DB_AUTO_MIGRATE=0.
+    Other threads wait until the migrations are done; a failed migration
+    raises and is retried on the next call.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        if DB_AUTO_MIGRATE:
+            from db_schema import migrate
+            try:
+                migrate()
+            except Exception as e:
+                print("Schema migration error:", e)
+                raise
+        _schema_ready = True
+
+# IN lists are sent in chunks to stay under SQL Server's 2100-parameter limit
+IN_LIST_CHUNK = 500
+
+
+def _chunks(values, size: int = IN_LIST_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+@span("db.check_attendance")
 def check_attendance(emp_id: str, date_str: str) -> bool:
     conn = get_connection()
-    cursor = conn.cursor()
-    query = """
-        SELECT [Status] FROM Attendance
-        WHERE [Employee ID] = ? AND [Date] = ?
+    try:
+        cursor = conn.cursor()
+        query = """
+            SELECT [Status] FROM Attendance
+            WHERE [Employee ID] = ? AND [Date] = ?
+        """
+        cursor.execute(query, (emp_id, date_str))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return row is not None and str(row[0]).lower() == "present"
+
+@span("db.check_attendance_bulk")
+def check_attendance_bulk(emp_ids, date_str: str) -> dict:
+    """
+    Attendance for several employees on one date, one query per
+    IN_LIST_CHUNK IDs. Returns {emp_id: True/False}; IDs with no
+    Attendance row are False.
+    """
+    ids = list(dict.fromkeys(str(e) for e in emp_ids))
+    if not ids:
+        return {}
+    rows = []
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for chunk in _chunks(ids):
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(f"""
+                SELECT [Employee ID], [Status] FROM Attendance
+                WHERE [Date] = ? AND [Employee ID] IN ({placeholders})
+            """, (date_str, *chunk))
+            rows.extend(cursor.fetchall())
+    finally:
+        conn.close()
+    present = {str(row[0]) for row in rows if str(row[1]).lower() == "present"}
+    return {emp_id: emp_id in present for emp_id in ids}
+
+# ClaimMembers is a normalized (Order Date, Employee ID) index over
+# ClaimHistory.[Group Members] so duplicate-claim checks don't have to
+# scan and JSON-parse the history.
+def _normalize_order_date(value) -> str:
+    return str(value).split()[0]
+
+def parse_group_members(value) -> list:
+    """
+    The Group Members JSON as a list of {"id", "name"} dicts. Only rows
+    stored with single quotes (written before the page used json.dumps)
+    fall back to swapping the quotes. Raises ValueError if neither parses.
+    """
+    if not value:
+        return []
+    if not isinstance(value, str):
+        return list(value)
+    try:
+        return json.loads(value)
+    except ValueError:
+        return json.loads(value.replace("'", '"'))
+
+def _group_member_ids(group_members) -> list:
+    return list(dict.fromkeys(str(m["id"]) for m in parse_group_members(group_members)))
+
+@span("db.find_already_claimed")
+def find_already_claimed(emp_ids, order_date) -> set:
+    """
+    Return the subset of emp_ids that already appear in a claim for order_date.
+    """
+    ids = list(dict.fromkeys(str(e) for e in emp_ids))
+    if not ids:
+        return set()
+    ensure_schema()
+    order_date_str = _normalize_order_date(order_date)
+    rows = []
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for chunk in _chunks(ids):
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(f"""
+                SELECT DISTINCT [Employee ID] FROM ClaimMembers
+                WHERE [Order Date] = ? AND [Employee ID] IN ({placeholders})
+            """, (order_date_str, *chunk))
+            rows.extend(cursor.fetchall())
+    finally:
+        conn.close()
+    return {str(row[0]) for row in rows}
+
+def fill_claim_members(cursor, batch_size: int = 1000) -> int:
+    """
+    Replace the ClaimMembers rows with ones built from the Group Members
+    JSON stored in ClaimHistory. Runs in the caller's transaction (also
+    used by db_schema migration 2); returns the number of rows written.
+    """
+    insert_sql = "INSERT INTO ClaimMembers ([Order Date], [Employee ID], [Bill Number]) VALUES (?, ?, ?)"
+    cursor.execute("SELECT [Order Date], [Bill Number], [Group Members] FROM ClaimHistory")
+    history_rows = cursor.fetchall()
+    backend.prepare_bulk_cursor(cursor)
+    cursor.execute("DELETE FROM ClaimMembers")
+    written = 0
+    batch = []
+    for order_date, bill_number, group_members in history_rows:
+        try:
+            member_ids = _group_member_ids(group_members)
+        except Exception:
+            print(f"Skipping unparsable Group Members for bill {bill_number}")
+            continue
+        order_date_str = _normalize_order_date(order_date)
+        batch.extend((order_date_str, emp_id, bill_number) for emp_id in member_ids)
+        if len(batch) >= batch_size:
+            cursor.executemany(insert_sql, batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(insert_sql, batch)
+        written += len(batch)
+    return written
+
+def backfill_claim_members(batch_size: int = 1000) -> int:
     """
-    cursor.execute(query, (emp_id, date_str))
-    row = cursor.fetchone()
-    conn.close()
-    return row is not None and row.Status.lower() == "present"
+    Rebuild ClaimMembers from ClaimHistory in one transaction.
+    Safe to re-run; returns the number of member rows written.
+    """
+    ensure_schema()
+    conn = get_connection()
+    try:
+        written = fill_claim_members(conn.cursor(), batch_size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return written
+
+# [Last Modified] on ClaimHistory is the change watermark used for
+# incremental refreshes; append_claim_record and update_claim_statuses
+# stamp it with the database's UTC clock (backend.utc_now_sql()), never
+# the app server's. A stamp is taken before its transaction commits, so
+# readers re-read an overlap window below their watermark to catch
+# transactions that committed late.
+CLAIM_WATERMARK_OVERLAP = float(os.getenv("CLAIM_WATERMARK_OVERLAP", "60"))
+
+def get_claims_watermark():
+    """
+    Latest [Last Modified] value in ClaimHistory, or None if nothing is stamped.
+    """
+    ensure_schema()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MAX([Last Modified]) FROM ClaimHistory")
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def load_claims_modified_since(watermark, overlap: float = 0):
+    """
+    ClaimHistory rows stamped after watermark minus overlap seconds (all
+    stamped rows when watermark is None). Rows in the overlap may have
+    been seen before; callers drop the ones they already merged.
+    """
+    from sqlalchemy import text
+
+    ensure_schema()
+    if watermark is None:
+        query = text("SELECT * FROM ClaimHistory WHERE [Last Modified] IS NOT NULL")
+        return pd.read_sql(query, get_engine())
+    since = pd.Timestamp(watermark) - timedelta(seconds=overlap)
+    query = text("SELECT * FROM ClaimHistory WHERE [Last Modified] > :since")
+    # ISO text compares correctly against both DATETIME2 and SQLite's text timestamps
+    return pd.read_sql(query, get_engine(), params={"since": since.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]})
 
 def update_claim_status(bill_number: str, new_status: str):
     """
     Update the Status column in ClaimHistory for the given Bill Number.
     """
+    update_claim_statuses({bill_number: new_status})
+
+@span("db.update_claim_statuses")
+def update_claim_statuses(changes: dict) -> int:
+    """
+    Apply {Bill Number: new Status} in a single transaction with one
+    batched UPDATE, moving the claims between ClaimMonthlySummary status
+    buckets in the same transaction. Returns the number of rows updated.
+    """
+    from claim_summary import status_change_deltas, apply_deltas
+
+    if not changes:
+        return 0
+    ensure_schema()
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        sql = "UPDATE ClaimHistory SET [Status] = ? WHERE [Bill Number] = ?"
-        cursor.execute(sql, (new_status, bill_number))
+        # monthly summary moves are read before the UPDATE changes the
+        # statuses, under a lock so a concurrent change can't move them first
+        backend.begin_write(cursor)
+        summary_deltas = status_change_deltas(cursor, changes)
+        backend.prepare_bulk_cursor(cursor)
+        sql = f"UPDATE ClaimHistory SET [Status] = ?, [Last Modified] = {backend.utc_now_sql()} WHERE [Bill Number] = ?"
+        cursor.executemany(sql, [(status, bill_number) for bill_number, status in changes.items()])
+        updated = cursor.rowcount
+        apply_deltas(cursor, summary_deltas)
         conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         conn.close()
+    # Some drivers report -1 for executemany
+    return updated if updated is not None and updated >= 0 else len(changes)
+
 
-    
 def append_claim_record(claim_data):
-    conn = get_connection()
-    cursor = conn.cursor()
-    sql = """
-        INSERT INTO ClaimHistory (
-            [Order Date], [Claim Date], [Claimant ID], [Group Members],
-            [Bill Amount], [Reimbursed Amount], [Bill Number], [Bill File], [Status]
+    append_claim_records([claim_data])
+
+@span("db.append_claim_records")
+def append_claim_records(claims) -> int:
+    """
+    Insert several claims, and their ClaimMembers rows, with batched
+    executemany calls in a single transaction, add them to
+    ClaimMonthlySummary and mark their bill images as claimed in the
+    perceptual-hash index. Returns the number inserted.
+    """
+    from claim_summary import new_claim_deltas, apply_deltas
+    from bill_phash import link_claim_bills
+
+    claims = list(claims)
+    if not claims:
+        return 0
+    ensure_schema()
+    claim_rows = []
+    member_rows = []
+    for claim_data in claims:
+        claim_rows.append((
+            claim_data["Order Date"],
+            claim_data["Claim Date"],
+            claim_data["Claimant ID"],
+            claim_data["Group Members"],
+            claim_data["Bill Amount"],
+            claim_data["Reimbursed Amount"],
+            claim_data["Bill Number"],
+            claim_data["Bill File"],
+            claim_data["Status"],
+        ))
+        order_date_str = _normalize_order_date(claim_data["Order Date"])
+        member_rows.extend(
+            (order_date_str, emp_id, claim_data["Bill Number"])
+            for emp_id in _group_member_ids(claim_data["Group Members"])
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    cursor.execute(sql, (
-        claim_data["Order Date"],
-        claim_data["Claim Date"],
-        claim_data["Claimant ID"],
-        claim_data["Group Members"],
-        claim_data["Bill Amount"],
-        claim_data["Reimbursed Amount"],
-        claim_data["Bill Number"],
-        claim_data["Bill File"],
-        claim_data["Status"]
-    ))
-    conn.commit()
-    conn.close()
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        backend.prepare_bulk_cursor(cursor)
+        sql = f"""
+            INSERT INTO ClaimHistory (
+                [Order Date], [Claim Date], [Claimant ID], [Group Members],
+                [Bill Amount], [Reimbursed Amount], [Bill Number], [Bill File], [Status],
+                [Last Modified]
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {backend.utc_now_sql()})
+        """
+        cursor.executemany(sql, claim_rows)
+        if member_rows:
+            cursor.executemany(
+                "INSERT INTO ClaimMembers ([Order Date], [Employee ID], [Bill Number]) VALUES (?, ?, ?)",
+                member_rows
+            )
+        apply_deltas(cursor, new_claim_deltas(cursor, claims))
+        link_claim_bills(cursor, claims)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(claim_rows)
@@ -0,0 +1,94 @@
+# employee_directory.py
+
+import os
+import threading
+import time
+from db_utils import load_employee_data
+
+
+# Seconds a loaded directory stays valid before EmployeeMaster is re-read
+EMPLOYEE_CACHE_TTL = int(os.getenv("EMPLOYEE_CACHE_TTL", "300"))
+
+
+class EmployeeDirectory:
+    """
+    In-memory view of EmployeeMaster indexed by Employee ID, with the
+    "Name (ID)" labels used by the pickers precomputed once per load.
+    """
+
+    def __init__(self, df, version: int = 0):
+        self.df = df
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.ids = [str(emp_id) for emp_id in df["Employee ID"].tolist()]
+        self._by_id = {
+            str(record["Employee ID"]): record for record in df.to_dict("records")
+        }
+        self._label_by_id = {
+            emp_id: f"{record['Employee Name']} ({emp_id})"
+            for emp_id, record in self._by_id.items()
+        }
+        self._id_by_label = {label: emp_id for emp_id, label in self._label_by_id.items()}
+        self.labels = [self._label_by_id[emp_id] for emp_id in self.ids]
+        self._search_index = None
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, emp_id):
+        return str(emp_id) in self._by_id
+
+    def get(self, emp_id):
+        return self._by_id.get(str(emp_id))
+
+    def name(self, emp_id, default=""):
+        record = self.get(emp_id)
+        return record["Employee Name"] if record is not None else default
+
+    def label(self, emp_id):
+        return self._label_by_id.get(str(emp_id), str(emp_id))
+
+    def id_from_label(self, label):
+        return self._id_by_label.get(label)
+
+    def search(self, query, limit=None, project=None):
+        """
+        Top employee IDs for a typeahead query (see employee_search);
+        the index is built on first use for this load of the directory.
+        """
+        from employee_search import EmployeeSearchIndex, EMPLOYEE_SEARCH_LIMIT
+
+        if self._search_index is None:
+            self._search_index = EmployeeSearchIndex(self)
+        return self._search_index.search(query, limit or EMPLOYEE_SEARCH_LIMIT, project)
+
+
+_directory = None
+_version = 0
+_lock = threading.Lock()
+
+
+def get_employee_directory(ttl: int = EMPLOYEE_CACHE_TTL) -> EmployeeDirectory:
+    """
+    Return the shared directory, reloading it when it is older than ttl
+    seconds or has been invalidated.
+    """
+    global _directory
+    with _lock:
+        stale = (
+            _directory is None
+            or _directory.version != _version
+            or time.monotonic() - _directory.loaded_at > ttl
+        )
+        if stale:
+            _directory = EmployeeDirectory(load_employee_data(), version=_version)
+        return _directory
+
+
+def invalidate_employee_directory():
+    """
+    Force the next get_employee_directory() call to re-read EmployeeMaster.
+    """
+    global _version
+    with _lock:
+        _version += 1
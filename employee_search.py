@@ -0,0 +1,97 @@
+# employee_search.py
+#
+# Typeahead search over an EmployeeDirectory so the pickers only render
+# the top matches instead of the whole EmployeeMaster. Built once per
+# directory load:
+#   - a sorted list of search keys (Employee ID, full name and each name
+#     word, case-folded) for prefix lookups with bisect
+#   - a trigram -> employee index for substring lookups (queries of three
+#     or more characters), verified against the full text
+# Results are ranked exact ID, ID prefix, name prefix, word prefix, then
+# substring, and can be limited to one project.
+
+import heapq
+import os
+import re
+from bisect import bisect_left
+
+
+EMPLOYEE_SEARCH_LIMIT = int(os.getenv("EMPLOYEE_SEARCH_LIMIT", "20"))
+
+# Rank of each kind of match; lower sorts first
+_EXACT_ID, _ID_PREFIX, _NAME_PREFIX, _WORD_PREFIX, _SUBSTRING = range(5)
+
+
+def _fold(value) -> str:
+    return " ".join(str(value).casefold().split())
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class EmployeeSearchIndex:
+    def __init__(self, directory):
+        self._names = {}
+        self._texts = {}
+        self._projects = {}
+        keys = []
+        self._trigram_index = {}
+        for emp_id in directory.ids:
+            record = directory.get(emp_id)
+            name = _fold(record.get("Employee Name", ""))
+            folded_id = _fold(emp_id)
+            self._names[emp_id] = name
+            self._projects.setdefault(str(record.get("Project") or ""), set()).add(emp_id)
+
+            keys.append((folded_id, _ID_PREFIX, emp_id))
+            keys.append((name, _NAME_PREFIX, emp_id))
+            keys.extend((word, _WORD_PREFIX, emp_id) for word in re.split(r"[\s.\-']+", name)[1:] if word)
+
+            text = f"{name} {folded_id}"
+            self._texts[emp_id] = text
+            for gram in _trigrams(text):
+                self._trigram_index.setdefault(gram, set()).add(emp_id)
+        keys.sort()
+        self._keys = keys
+        self._key_strings = [key for key, _, _ in keys]
+        self._folded_ids = {_fold(emp_id): emp_id for emp_id in directory.ids}
+
+    def _prefix_matches(self, query: str, ranks: dict):
+        start = bisect_left(self._key_strings, query)
+        for key, rank, emp_id in self._keys[start:]:
+            if not key.startswith(query):
+                break
+            if rank < ranks.get(emp_id, _SUBSTRING + 1):
+                ranks[emp_id] = rank
+
+    def _substring_matches(self, query: str, ranks: dict):
+        grams = sorted((self._trigram_index.get(g, set()) for g in _trigrams(query)), key=len)
+        if not grams or not grams[0]:
+            return
+        candidates = set.intersection(*grams)
+        for emp_id in candidates:
+            if emp_id not in ranks and query in self._texts[emp_id]:
+                ranks[emp_id] = _SUBSTRING
+
+    def search(self, query: str, limit: int = EMPLOYEE_SEARCH_LIMIT, project: str = None) -> list:
+        """
+        Employee IDs matching query, best first, at most limit of them.
+        An empty query returns the first employees by name.
+        """
+        query = _fold(query or "")
+        ranks = {}
+        if not query:
+            ranks = {emp_id: _NAME_PREFIX for emp_id in self._names}
+        else:
+            exact = self._folded_ids.get(query)
+            if exact is not None:
+                ranks[exact] = _EXACT_ID
+            self._prefix_matches(query, ranks)
+            if len(query) >= 3:
+                self._substring_matches(query, ranks)
+
+        if project is not None:
+            in_project = self._projects.get(str(project), set())
+            ranks = {emp_id: rank for emp_id, rank in ranks.items() if emp_id in in_project}
+        return heapq.nsmallest(limit, ranks, key=lambda emp_id: (ranks[emp_id], self._names[emp_id], emp_id))
@@ -0,0 +1,229 @@
+# export_claims.py
+#
+# Stream ClaimHistory to CSV or Parquet in bounded chunks, for audits and
+# multi-year exports. Rows are read with cursor.fetchmany and each chunk is
+# written before the next is fetched, so memory stays flat however large
+# the table is.
+#
+#   python export_claims.py claims_2024.parquet [--from 2024-01-01] [--to 2024-12-31]
+#                           [--date-column "Order Date"] [--chunk-size 5000]
+#                           [--explode-members] [--format csv|parquet]
+#
+# Group Members JSON is flattened into Member Count / Member IDs / Member
+# Names columns (";"-separated, like the import CSV), or into one row per
+# member with --explode-members. Claims whose Group Members can't be
+# parsed keep empty member columns (a null Member Count, not 0) and are
+# listed at the end; the command then exits with status 1.
+
+import argparse
+import os
+import sys
+from datetime import timedelta
+import pandas as pd
+from db_utils import get_connection, parse_group_members, CLAIM_DATE_COLUMNS
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+DATE_COLUMNS = ["Order Date", "Claim Date"]
+AMOUNT_COLUMNS = ["Bill Amount", "Reimbursed Amount"]
+
+
+def _members(value) -> list:
+    # Raises ValueError / TypeError for a value that isn't Group Members JSON
+    return [(str(m.get("id", "")), str(m.get("name", ""))) for m in parse_group_members(value) if isinstance(m, dict)]
+
+
+def flatten_members(df: pd.DataFrame, explode: bool = False, unparsed: list = None) -> pd.DataFrame:
+    """
+    Replace the Group Members JSON column with plain columns. Rows that
+    can't be parsed get empty member columns, and their Bill Numbers are
+    appended to unparsed.
+    """
+    if "Group Members" not in df.columns:
+        return df
+    bills = df["Bill Number"] if "Bill Number" in df.columns else pd.Series(df.index, index=df.index)
+
+    def parse(value, bill_number):
+        try:
+            return _members(value)
+        except (ValueError, TypeError):
+            if unparsed is not None:
+                unparsed.append(bill_number)
+            return None
+
+    members = pd.Series(
+        [parse(value, bill) for value, bill in zip(df["Group Members"], bills)], index=df.index, dtype=object
+    )
+    df = df.drop(columns=["Group Members"])
+    if explode:
+        df["Member"] = members
+        df = df.explode("Member")
+        df["Member ID"] = df["Member"].map(lambda m: m[0] if isinstance(m, tuple) else None)
+        df["Member Name"] = df["Member"].map(lambda m: m[1] if isinstance(m, tuple) else None)
+        return df.drop(columns=["Member"]).reset_index(drop=True)
+    df["Member Count"] = members.map(lambda ms: len(ms) if ms is not None else None)
+    df["Member IDs"] = members.map(lambda ms: ";".join(m[0] for m in ms) if ms is not None else None)
+    df["Member Names"] = members.map(lambda ms: ";".join(m[1] for m in ms) if ms is not None else None)
+    return df
+
+
+def _normalize_types(df: pd.DataFrame) -> pd.DataFrame:
+    # Fixed dtypes per column so every chunk has the same Parquet schema
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+        elif col in AMOUNT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        elif col == "Last Modified":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif col == "Claim ID":
+            df[col] = df[col].astype("Int64")
+        elif col == "Member Count":
+            df[col] = df[col].astype("Int64")  # null for unparsable members
+        else:
+            df[col] = df[col].map(lambda v: None if v is None or v != v else str(v)).astype("object")
+    return df
+
+
+def iter_claim_chunks(date_from=None, date_to=None, date_column="Order Date", chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield ClaimHistory rows as DataFrames of at most chunk_size rows,
+    ordered by date_column. date_to is inclusive. An empty range yields one
+    empty frame so the output still gets its header / schema.
+    """
+    if date_column not in CLAIM_DATE_COLUMNS:
+        raise ValueError(f"Unsupported date column: {date_column}")
+    where, params = [], []
+    if date_from is not None:
+        where.append(f"[{date_column}] >= ?")
+        params.append(date_from.isoformat())
+    if date_to is not None:
+        where.append(f"[{date_column}] < ?")
+        params.append((date_to + timedelta(days=1)).isoformat())
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT * FROM ClaimHistory {where_sql} ORDER BY [{date_column}], [Bill Number]",
+            tuple(params)
+        )
+        columns = [d[0] for d in cursor.description]
+        yielded = False
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows and yielded:
+                break
+            yield pd.DataFrame([tuple(row) for row in rows], columns=columns)
+            yielded = True
+            if not rows:
+                break
+    finally:
+        conn.close()
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        if self.writer is None:
+            table = self.pa.Table.from_pandas(df, preserve_index=False)
+            # Text columns that are all-null in the first chunk would be typed "null"
+            self.schema = self.pa.schema([
+                field.with_type(self.pa.string()) if self.pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]).remove_metadata()
+            self.writer = self.pq.ParquetWriter(self.path, self.schema, compression="snappy")
+        self.writer.write_table(self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def export_claims(path, fmt=None, date_from=None, date_to=None, date_column="Order Date",
+                  chunk_size=EXPORT_CHUNK_SIZE, explode_members=False, unparsed: list = None) -> int:
+    """
+    Write the selected claims to path and return the number of rows
+    written (member rows with explode_members). The file is written under
+    a temporary name and renamed at the end, so a failed export never
+    leaves a truncated file behind. Bill Numbers of claims whose Group
+    Members couldn't be parsed are appended to unparsed.
+    """
+    unparsed = unparsed if unparsed is not None else []
+    fmt = fmt or ("parquet" if path.lower().endswith((".parquet", ".pq")) else "csv")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    sink = _ParquetSink(tmp_path) if fmt == "parquet" else _CsvSink(tmp_path)
+    written = 0
+    try:
+        for chunk in iter_claim_chunks(date_from, date_to, date_column, chunk_size):
+            chunk = _normalize_types(flatten_members(chunk, explode_members, unparsed))
+            sink.write(chunk)
+            written += len(chunk)
+        sink.close()
+        os.replace(tmp_path, path)
+    except Exception:
+        sink.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export ClaimHistory to CSV or Parquet in chunks.")
+    parser.add_argument("path", help="output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="defaults to the file extension")
+    parser.add_argument("--from", dest="date_from", type=pd.Timestamp, help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=pd.Timestamp, help="last date (inclusive), YYYY-MM-DD")
+    parser.add_argument("--date-column", choices=list(CLAIM_DATE_COLUMNS), default="Order Date")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("--explode-members", action="store_true", help="one row per group member")
+    args = parser.parse_args(argv)
+
+    unparsed = []
+    written = export_claims(
+        args.path,
+        fmt=args.format,
+        date_from=args.date_from.date() if args.date_from is not None else None,
+        date_to=args.date_to.date() if args.date_to is not None else None,
+        date_column=args.date_column,
+        chunk_size=args.chunk_size,
+        explode_members=args.explode_members,
+        unparsed=unparsed,
+    )
+    print(f"Exported {written} rows to {args.path}")
+    if unparsed:
+        print(f"Group Members could not be parsed for {len(unparsed)} claims; their member columns are empty:")
+        for bill_number in unparsed:
+            print(f"  Bill Number {bill_number}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
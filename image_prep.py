@@ -0,0 +1,108 @@
+# image_prep.py
+
+import io
+import os
+from typing import NamedTuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent as-is
+    Image = None
+    ImageOps = None
+
+
+# Longest edge (pixels) and JPEG quality used for images sent to OCR
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "2048"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "85"))
+
+# Formats the vision model accepts without re-encoding
+_PASSTHROUGH_MIMES = {"image/jpeg", "image/png", "image/webp"}
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime: str
+    original_size: int
+    prepared_size: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - self.prepared_size
+
+
+def detect_mime(data: bytes) -> str:
+    """
+    Sniff the image type from its magic bytes; defaults to image/jpeg.
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return "image/jpeg"
+
+
+def prepare_image_for_ocr(file_bytes: bytes, max_dimension: int = None, quality: int = None) -> PreparedImage:
+    """
+    Apply EXIF orientation, cap the longest edge at max_dimension and
+    re-encode as JPEG. The original bytes are kept when they are already
+    upright, small enough, in an accepted format and not larger than the
+    re-encoded version.
+    """
+    max_dimension = max_dimension or OCR_MAX_DIMENSION
+    quality = quality or OCR_JPEG_QUALITY
+    original_mime = detect_mime(file_bytes)
+    original = PreparedImage(file_bytes, original_mime, len(file_bytes), len(file_bytes))
+
+    if Image is None:
+        return original
+
+    try:
+        with Image.open(io.BytesIO(file_bytes)) as img:
+            img.load()
+            rotated = _has_orientation(img)
+            oriented = ImageOps.exif_transpose(img)
+            needs_resize = max(oriented.size) > max_dimension
+            if needs_resize:
+                oriented.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            if oriented.mode in ("RGBA", "LA", "P"):
+                rgba = oriented.convert("RGBA")
+                flattened = Image.new("RGB", rgba.size, (255, 255, 255))
+                flattened.paste(rgba, mask=rgba.getchannel("A"))
+                oriented = flattened
+            elif oriented.mode != "RGB":
+                oriented = oriented.convert("RGB")
+
+            buffer = io.BytesIO()
+            oriented.save(buffer, format="JPEG", quality=quality, optimize=True)
+            encoded = buffer.getvalue()
+    except Exception as e:
+        print("Image preprocessing skipped:", e)
+        return original
+
+    keep_original = (
+        not needs_resize
+        and not rotated
+        and original_mime in _PASSTHROUGH_MIMES
+        and len(file_bytes) <= len(encoded)
+    )
+    if keep_original:
+        return original
+    return PreparedImage(encoded, "image/jpeg", len(file_bytes), len(encoded))
+
+
+def _has_orientation(img) -> bool:
+    try:
+        return img.getexif().get(0x0112, 1) != 1
+    except Exception:
+        return False
@@ -0,0 +1,184 @@
+# import_claims.py
+#
+# Bulk-import lunch claims from a CSV, validating them with the same rules
+# as the claim page. Rows are processed in batches; every check is a
+# column operation or one set-based query per order date in the batch.
+#
+#   python import_claims.py claims.csv [--errors claims.errors.csv]
+#                           [--batch-size 1000] [--dry-run]
+#
+# Required columns: Order Date, Claim Date (YYYY-MM-DD), Claimant ID,
+# Group Members (employee IDs separated by ";"), Bill Amount, Bill Number.
+# Optional: Bill File, Bill Date and Extracted Amount (checked against the
+# order date / bill amount when present), Status (defaults to Pending).
+
+import argparse
+import json
+import os
+import sys
+import pandas as pd
+from claim_rules import (
+    parse_bill_dates, claim_window_errors, amount_mismatch, reimbursable_amounts
+)
+from db_utils import check_attendance_bulk, find_already_claimed, append_claim_records
+from employee_directory import get_employee_directory
+
+
+REQUIRED_COLUMNS = ["Order Date", "Claim Date", "Claimant ID", "Group Members", "Bill Amount", "Bill Number"]
+
+
+def _flag(errors, mask, message):
+    for idx in mask[mask.fillna(False).astype(bool)].index:
+        errors[idx].append(message)
+
+
+def validate_batch(batch: pd.DataFrame, employees, seen_members: set):
+    """
+    Validate one batch of CSV rows. Returns (claims, errors) where claims
+    are ready for append_claim_records and errors maps row index -> messages.
+    seen_members holds (order date, employee ID) pairs accepted by earlier
+    batches and is updated with this batch's valid rows.
+    """
+    errors = {idx: [] for idx in batch.index}
+
+    order_dates = pd.to_datetime(batch["Order Date"].str.strip(), format="%Y-%m-%d", errors="coerce")
+    claim_dates = pd.to_datetime(batch["Claim Date"].str.strip(), format="%Y-%m-%d", errors="coerce")
+    _flag(errors, order_dates.isna(), "invalid Order Date (expected YYYY-MM-DD)")
+    _flag(errors, claim_dates.isna(), "invalid Claim Date (expected YYYY-MM-DD)")
+    window = claim_window_errors(order_dates, claim_dates)
+    for message in window.dropna().unique():
+        _flag(errors, window == message, message)
+
+    claimant_ids = batch["Claimant ID"].str.strip()
+    _flag(errors, ~claimant_ids.isin(employees.ids), "unknown Claimant ID")
+
+    bill_amounts = pd.to_numeric(batch["Bill Amount"], errors="coerce")
+    _flag(errors, ~(bill_amounts > 0), "Bill Amount must be a positive number")
+    _flag(errors, batch["Bill Number"].str.strip() == "", "missing Bill Number")
+
+    if "Extracted Amount" in batch.columns:
+        extracted = pd.to_numeric(batch["Extracted Amount"], errors="coerce")
+        present = batch["Extracted Amount"].str.strip() != ""
+        _flag(errors, present & amount_mismatch(bill_amounts, extracted).fillna(True),
+              "Bill Amount does not match the extracted bill total")
+
+    if "Bill Date" in batch.columns:
+        bill_dates = parse_bill_dates(batch["Bill Date"])
+        present = batch["Bill Date"].str.strip() != ""
+        _flag(errors, present & (bill_dates != order_dates.dt.normalize()),
+              "bill date does not match the Order Date")
+
+    # One row per (claim row, member) for the membership checks
+    members = (
+        batch["Group Members"].str.split(";").explode().str.strip()
+        .rename("Employee ID").to_frame()
+    )
+    members = members[members["Employee ID"].notna() & (members["Employee ID"] != "")]
+    # "E1;E1" names one member, not a clash with itself
+    members = members[~members.assign(_row=members.index).duplicated(subset=["_row", "Employee ID"]).to_numpy()]
+    members["Order Date"] = order_dates.dt.strftime("%Y-%m-%d").reindex(members.index)
+    _flag(errors, ~batch.index.to_series().isin(members.index), "no group members")
+    unknown = members[~members["Employee ID"].isin(employees.ids)]
+    _flag(errors, batch.index.to_series().isin(unknown.index), "unknown employee in Group Members")
+
+    members = members[members["Order Date"].notna()]
+    for order_date, group in members.groupby("Order Date"):
+        attendance = check_attendance_bulk(group["Employee ID"].unique(), order_date)
+        absent = group[~group["Employee ID"].map(attendance).fillna(False).astype(bool)]
+        for idx, emp_id in absent["Employee ID"].items():
+            errors[idx].append(f"{emp_id} was absent on {order_date}")
+
+        claimed = find_already_claimed(group["Employee ID"].unique(), order_date)
+        for idx, emp_id in group.loc[group["Employee ID"].isin(claimed), "Employee ID"].items():
+            errors[idx].append(f"{emp_id} already claimed on {order_date}")
+
+    # Duplicates inside the file: otherwise-valid rows are accepted in file
+    # order, each rejected only against members of rows accepted before it
+    row_keys = {}
+    for idx, order_date, emp_id in zip(members.index, members["Order Date"], members["Employee ID"]):
+        row_keys.setdefault(idx, []).append((order_date, emp_id))
+    valid_rows = []
+    for idx, messages in errors.items():
+        if messages:
+            continue
+        clashes = [key for key in row_keys.get(idx, []) if key in seen_members]
+        if clashes:
+            for order_date, emp_id in clashes:
+                messages.append(f"{emp_id} appears in another claim on {order_date} in this file")
+            continue
+        seen_members.update(row_keys.get(idx, []))
+        valid_rows.append(idx)
+    valid_members = members[members.index.isin(valid_rows)]
+
+    member_counts = valid_members.groupby(level=0).size()
+    reimbursed = reimbursable_amounts(bill_amounts[valid_rows], member_counts.reindex(valid_rows))
+    member_lists = valid_members.groupby(level=0)["Employee ID"].apply(list)
+
+    def optional(col, idx, default):
+        value = batch.at[idx, col].strip() if col in batch.columns else ""
+        return value or default
+
+    claims = [
+        {
+            "Order Date": order_dates[idx].strftime("%Y-%m-%d"),
+            "Claim Date": claim_dates[idx].strftime("%Y-%m-%d"),
+            "Claimant ID": claimant_ids[idx],
+            "Group Members": json.dumps([
+                {"id": emp_id, "name": str(employees.name(emp_id))} for emp_id in member_lists[idx]
+            ]),
+            "Bill Amount": float(bill_amounts[idx]),
+            "Reimbursed Amount": float(reimbursed[idx]),
+            "Bill Number": batch.at[idx, "Bill Number"].strip(),
+            "Bill File": optional("Bill File", idx, ""),
+            "Status": optional("Status", idx, "Pending"),
+        }
+        for idx in valid_rows
+    ]
+    return claims, {idx: messages for idx, messages in errors.items() if messages}
+
+
+def import_claims(csv_path, errors_path, batch_size=1000, dry_run=False):
+    employees = get_employee_directory()
+    seen_members = set()
+    total = inserted = rejected = 0
+    error_rows = []
+
+    for batch in pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=batch_size):
+        missing = [col for col in REQUIRED_COLUMNS if col not in batch.columns]
+        if missing:
+            raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+        total += len(batch)
+        claims, errors = validate_batch(batch, employees, seen_members)
+        if claims and not dry_run:
+            append_claim_records(claims)
+        inserted += len(claims)
+        rejected += len(errors)
+        for idx, messages in errors.items():
+            # +2: one for the header line, one for 1-based numbering
+            error_rows.append({
+                "Line": idx + 2,
+                "Bill Number": batch.at[idx, "Bill Number"],
+                "Errors": "; ".join(messages),
+            })
+
+    pd.DataFrame(error_rows, columns=["Line", "Bill Number", "Errors"]).to_csv(errors_path, index=False)
+    return total, inserted, rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import lunch claims from a CSV file.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--errors", help="where to write the per-row error report")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="validate only, insert nothing")
+    args = parser.parse_args(argv)
+
+    errors_path = args.errors or f"{os.path.splitext(args.csv_path)[0]}.errors.csv"
+    total, inserted, rejected = import_claims(args.csv_path, errors_path, args.batch_size, args.dry_run)
+    action = "Validated" if args.dry_run else "Inserted"
+    print(f"Read {total} rows. {action} {inserted}, rejected {rejected}. Error report: {errors_path}")
+    return 0 if rejected == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
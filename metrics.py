@@ -0,0 +1,194 @@
+# metrics.py
+#
+# In-process timing metrics for the hot paths (employee / claim loads,
+# attendance lookups, OCR, thumbnail encoding). Spans record into latency
+# histograms shared by every session of the app process:
+#
+#   with span("ocr.request"):
+#       ...
+#
+#   @span("db.load_employee_data")
+#   def load_employee_data(): ...
+#
+# Plain totals (e.g. bytes saved by image prep) are kept as counters:
+#
+#   increment("ocr.image_bytes_saved", saved)
+#
+# Export with to_prometheus() / to_json() or write_metrics_file().
+
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_FILE = os.getenv("METRICS_FILE", "data/metrics.json")
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """
+        Approximate quantile: the upper bound of the bucket holding it.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": round(self.total, 6),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "max_ms": round(self.max * 1000, 3),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+
+
+def record(name: str, seconds: float, error: bool = False):
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.observe(seconds, error)
+
+
+def increment(name: str, value: float = 1):
+    if not METRICS_ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+class span:
+    """
+    Time a block (context manager) or a function (decorator) under `name`.
+    Exceptions are counted as errors and re-raised.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self._started, error=exc_type is not None)
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {name: hist.summary() for name, hist in sorted(_histograms.items())}
+
+
+def counters() -> dict:
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def to_json() -> str:
+    return json.dumps(
+        {"generated_at": datetime.now().isoformat(timespec="seconds"), "metrics": snapshot(), "counters": counters()},
+        indent=2,
+    )
+
+
+def to_prometheus() -> str:
+    """
+    Prometheus text exposition format: one histogram family with a
+    `span` label per recorded name, an error counter and the plain
+    counters.
+    """
+    lines = [
+        "# HELP app_span_duration_seconds Duration of instrumented code paths.",
+        "# TYPE app_span_duration_seconds histogram",
+    ]
+    with _lock:
+        items = sorted(_histograms.items())
+        for name, hist in items:
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                lines.append(f'app_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'app_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {hist.count}')
+            lines.append(f'app_span_duration_seconds_sum{{span="{name}"}} {hist.total:.6f}')
+            lines.append(f'app_span_duration_seconds_count{{span="{name}"}} {hist.count}')
+        lines.append("# HELP app_span_errors_total Instrumented calls that raised.")
+        lines.append("# TYPE app_span_errors_total counter")
+        for name, hist in items:
+            lines.append(f'app_span_errors_total{{span="{name}"}} {hist.errors}')
+        lines.append("# HELP app_counter_total Totals counted by the app.")
+        lines.append("# TYPE app_counter_total counter")
+        for name, value in sorted(_counters.items()):
+            lines.append(f'app_counter_total{{name="{name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: str = METRICS_FILE) -> str:
+    """
+    Write the JSON export to path (atomically) and return the path.
+    A .prom path gets the Prometheus text format instead.
+    """
+    body = to_prometheus() if path.endswith(".prom") else to_json()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+    return path
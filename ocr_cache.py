@@ -0,0 +1,86 @@
+# ocr_cache.py
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from db_utils import get_connection, ensure_schema
+
+
+# Number of OCR results kept in the in-process LRU layer
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "256"))
+
+# The persistent layer is the OcrResultCache table (see db_schema), stored
+# alongside OcrExtractedBills.
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def image_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def _remember(digest: str, data: dict):
+    with _lru_lock:
+        _lru[digest] = data
+        _lru.move_to_end(digest)
+        while len(_lru) > OCR_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def get_cached_result(digest: str):
+    """
+    Look up an OCR result by image digest: LRU first, then OcrResultCache.
+    Returns a fresh dict the caller may modify, or None on a miss.
+    """
+    with _lru_lock:
+        data = _lru.get(digest)
+        if data is not None:
+            _lru.move_to_end(digest)
+            return dict(data)
+
+    try:
+        ensure_schema()
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT result_json FROM OcrResultCache WHERE image_sha256 = ?", (digest,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+    except Exception as e:
+        print("OCR cache read error:", e)
+        return None
+
+    if row is None:
+        return None
+    data = json.loads(row[0])
+    _remember(digest, data)
+    return dict(data)
+
+
+def store_result(digest: str, data: dict):
+    _remember(digest, dict(data))
+    try:
+        ensure_schema()
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO OcrResultCache (image_sha256, result_json, created_at) VALUES (?, ?, ?)",
+                (digest, json.dumps(data), datetime.now())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        # Most likely a concurrent insert of the same image; the LRU still has it
+        print("OCR cache write error:", e)
+
+
+def clear_memory_cache():
+    with _lru_lock:
+        _lru.clear()
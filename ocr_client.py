@@ -0,0 +1,251 @@
+# ocr_client.py
+#
+# Wrapper around the Groq client used for OCR. It keeps the same
+# client.chat.completions.create(...) interface and adds a token-bucket
+# rate limiter, jittered exponential backoff for transient errors, a
+# circuit breaker and a per-request deadline.
+
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+
+OCR_RATE_PER_MINUTE = float(os.getenv("OCR_RATE_PER_MINUTE", "30"))
+OCR_RATE_BURST = int(os.getenv("OCR_RATE_BURST", "5"))
+OCR_MAX_RETRIES = int(os.getenv("OCR_MAX_RETRIES", "4"))
+OCR_BACKOFF_BASE = float(os.getenv("OCR_BACKOFF_BASE", "1.0"))
+OCR_BACKOFF_MAX = float(os.getenv("OCR_BACKOFF_MAX", "20"))
+OCR_REQUEST_DEADLINE = float(os.getenv("OCR_REQUEST_DEADLINE", "90"))
+OCR_BREAKER_THRESHOLD = int(os.getenv("OCR_BREAKER_THRESHOLD", "5"))
+OCR_BREAKER_RESET = float(os.getenv("OCR_BREAKER_RESET", "30"))
+
+
+class OcrDeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average with bursts of `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # Take a token if one is available, else return the wait until one is
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, deadline: float = None) -> float:
+        """
+        Block until a token is available; returns seconds waited.
+        Raises OcrDeadlineExceeded if that would pass the deadline.
+        """
+        waited = 0.0
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return waited
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise OcrDeadlineExceeded("OCR request deadline reached while rate limited")
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds, then lets a single trial call through.
+    Every trial must be settled: record_success closes the breaker,
+    record_failure or abandon_trial re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+
+    def record_failure(self) -> bool:
+        """
+        Count a failure; returns True if this call opened the breaker.
+        """
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.failure_threshold:
+                opened = self.state != "open"
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                return opened
+            return False
+
+    def abandon_trial(self) -> bool:
+        """
+        Re-open a half-open breaker whose trial call ended without telling
+        us whether the service recovered (e.g. the deadline passed).
+        Returns True if the breaker was re-opened.
+        """
+        with self._lock:
+            if self.state != "half-open":
+                return False
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            return True
+
+
+def _is_retryable(exc) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    try:
+        from groq import APIConnectionError  # also covers APITimeoutError
+    except ImportError:
+        APIConnectionError = ConnectionError
+    return isinstance(exc, (APIConnectionError, ConnectionError, TimeoutError))
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientOcrClient:
+    """
+    Drop-in for the Groq client in ocr_groq: exposes
+    chat.completions.create(**kwargs) and counters via stats().
+    """
+
+    def __init__(
+        self,
+        client,
+        rate_per_minute: float = OCR_RATE_PER_MINUTE,
+        burst: int = OCR_RATE_BURST,
+        max_retries: int = OCR_MAX_RETRIES,
+        backoff_base: float = OCR_BACKOFF_BASE,
+        backoff_max: float = OCR_BACKOFF_MAX,
+        deadline: float = OCR_REQUEST_DEADLINE,
+        breaker: CircuitBreaker = None,
+    ):
+        self.client = client
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.breaker = breaker or CircuitBreaker(OCR_BREAKER_THRESHOLD, OCR_BREAKER_RESET)
+        self._counters = {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "throttled": 0,          # 429 responses from the provider
+            "local_waits": 0,        # requests delayed by our own token bucket
+            "deadline_exceeded": 0,
+            "breaker_rejections": 0,
+            "breaker_opens": 0,
+        }
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["breaker_state"] = self.breaker.state
+        return stats
+
+    def _backoff(self, attempt: int, exc) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # "full jitter": uniform between 0 and the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def create(self, **kwargs):
+        self._count("requests")
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("breaker_rejections")
+                raise CircuitOpenError("OCR service temporarily unavailable (circuit open)")
+            try:
+                if self.bucket.acquire(deadline) > 0:
+                    self._count("local_waits")
+            except OcrDeadlineExceeded:
+                self._count("deadline_exceeded")
+                self.breaker.abandon_trial()
+                raise
+
+            remaining = deadline - time.monotonic()
+            try:
+                result = self.client.chat.completions.create(timeout=remaining, **kwargs)
+            except Exception as e:
+                if getattr(e, "status_code", None) == 429:
+                    self._count("throttled")
+                retryable = _is_retryable(e)
+                if retryable:
+                    if self.breaker.record_failure():
+                        self._count("breaker_opens")
+                elif getattr(e, "status_code", None) is not None:
+                    # the provider answered (e.g. 400), so it is reachable
+                    self.breaker.record_success()
+                else:
+                    self.breaker.abandon_trial()
+                if not retryable or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    # record_failure above already re-opened a half-open breaker
+                    self._count("deadline_exceeded")
+                    self._count("failures")
+                    raise OcrDeadlineExceeded(f"OCR request deadline reached after {attempt + 1} attempts") from e
+                self._count("retries")
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self._count("successes")
+            return result
@@ -1,28 +1,60 @@
 # ocr_groq.py
 
-from groq import Groq
 import base64
-from tempfile import NamedTemporaryFile
 import os
 import json
-import pyodbc
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
 from dotenv import load_dotenv
+from db_utils import get_connection
+from ocr_cache import image_digest, get_cached_result, store_result
+from image_prep import prepare_image_for_ocr
+from bill_store import StoredBill
+from ocr_client import ResilientOcrClient
+import metrics
+from metrics import span
 
 load_dotenv()
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+_client = None
+_client_lock = threading.Lock()
 
-# SQL Server connection string
-conn_str = (
-    f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-    f"SERVER={os.getenv('SQL_SERVER')};"
-    f"DATABASE={os.getenv('SQL_DATABASE')};"
-    f"Trusted_Connection=yes;"
-)
+def get_client():
+    """
+    The shared OCR client, built on first use so pages that never reach
+    the upload step don't import groq.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from groq import Groq
+
+                # Retries are handled by ResilientOcrClient (rate limit, backoff,
+                # circuit breaker, deadline), so the SDK's own retry loop is off.
+                _client = ResilientOcrClient(Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0))
+    return _client
+
+def __getattr__(name):
+    # keeps `ocr_groq.client` working without an import-time client
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Upper bound on simultaneous OCR requests for one multi-bill claim
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+
+def get_ocr_client_stats():
+    """
+    Throttle / retry / circuit breaker counters for the shared OCR client.
+    """
+    return get_client().stats()
 
 def insert_ocr_result_to_sql(data):
     try:
-        with pyodbc.connect(conn_str) as conn:
+        conn = get_connection()
+        try:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO OcrExtractedBills (restaurant_name, bill_number, date, total)
@@ -34,22 +66,30 @@ def insert_ocr_result_to_sql(data):
                 data.get("total")
             ))
             conn.commit()
+        finally:
+            conn.close()
     except Exception as e:
         print("SQL insert error:", e)
 
-def extract_bill_details_from_image(uploaded_file):
-    try:
-        # ✅ Save uploaded file to a temporary location
-        file_bytes = uploaded_file.getvalue()  # Ensures full content
-        with NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[-1]) as tmp_file:
-            tmp_file.write(file_bytes)
-            tmp_path = tmp_file.name
+def _request_bill_details(file_bytes, ocr_client=None):
+    """
+    Send one bill image to the vision model and return the parsed JSON.
+    Raises on API errors and on responses that are not valid JSON.
+    """
+    ocr_client = ocr_client or get_client()
 
-        # ✅ Encode image to base64
-        base64_image = base64.b64encode(file_bytes).decode("utf-8")
+    # ✅ Downscale / re-encode, then encode image to base64
+    with span("ocr.image_prep"):
+        prepared = prepare_image_for_ocr(file_bytes)
+    metrics.increment("ocr.image_bytes_original", prepared.original_size)
+    metrics.increment("ocr.image_bytes_sent", prepared.prepared_size)
+    if prepared.bytes_saved > 0:
+        metrics.increment("ocr.images_reencoded")
+    base64_image = base64.b64encode(prepared.data).decode("utf-8")
 
-        # ✅ Send image + instruction to Groq
-        result = client.chat.completions.create(
+    # ✅ Send image + instruction to Groq
+    with span("ocr.request"):
+        result = ocr_client.chat.completions.create(
             messages=[
                 {
                     "role": "user",
@@ -70,7 +110,7 @@ def extract_bill_details_from_image(uploaded_file):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
+                                "url": f"data:{prepared.mime};base64,{base64_image}",
                             },
                         },
                     ],
@@ -79,17 +119,71 @@ def extract_bill_details_from_image(uploaded_file):
             model="meta-llama/llama-4-scout-17b-16e-instruct",
         )
 
-        response_text = result.choices[0].message.content.strip()
+    response_text = result.choices[0].message.content.strip()
 
-        try:
-            extracted_data = json.loads(response_text)
-            insert_ocr_result_to_sql(extracted_data)
-            return extracted_data
-        except json.JSONDecodeError:
-            print("Warning: Invalid JSON from OCR. Raw content returned.")
-            print(response_text)
-            return None
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid JSON from OCR: {response_text}")
+
+@span("ocr.extract")
+def _extract_bill_details(file_bytes, ocr_client=None, digest=None):
+    """
+    OCR one bill, reusing the cached result for identical image bytes.
+    Only a real model call records a row in OcrExtractedBills.
+    """
+    digest = digest or image_digest(file_bytes)
+    cached = get_cached_result(digest)
+    if cached is not None:
+        return cached
+
+    extracted_data = _request_bill_details(file_bytes, ocr_client)
+    insert_ocr_result_to_sql(extracted_data)
+    store_result(digest, extracted_data)
+    return dict(extracted_data)
+
+def extract_bill_details_from_image(uploaded_file):
+    try:
+        if isinstance(uploaded_file, StoredBill):
+            return _extract_bill_details(uploaded_file.data, digest=uploaded_file.digest)
+        return _extract_bill_details(uploaded_file.getvalue())
 
     except Exception as e:
         print("OCR error:", e)
         return None
+
+class BillExtraction(NamedTuple):
+    filename: str
+    data: Optional[dict]
+    error: Optional[str]
+
+def extract_bill_details_batch(uploaded_files, max_workers=None, ocr_client=None):
+    """
+    Run OCR for several bills concurrently. Accepts StoredBill entries
+    from bill_store (their buffer and digest are reused as-is) or raw
+    uploaded files.
+    Returns one BillExtraction per file, in upload order; a failed file
+    has data=None and the error message set, without affecting the others.
+    """
+    # Read the buffers up front so worker threads never touch the upload objects
+    jobs = [
+        (f.name, f.data, f.digest) if isinstance(f, StoredBill) else (f.name, f.getvalue(), None)
+        for f in uploaded_files
+    ]
+    if not jobs:
+        return []
+    max_workers = max(1, min(max_workers or OCR_MAX_CONCURRENCY, len(jobs)))
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr") as pool:
+        futures = [
+            pool.submit(_extract_bill_details, file_bytes, ocr_client, digest)
+            for _, file_bytes, digest in jobs
+        ]
+        results = []
+        for (filename, _, _), future in zip(jobs, futures):
+            try:
+                results.append(BillExtraction(filename, future.result(), None))
+            except Exception as e:
+                print(f"OCR error for {filename}:", e)
+                results.append(BillExtraction(filename, None, str(e)))
+    return results
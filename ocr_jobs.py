@@ -0,0 +1,261 @@
+# ocr_jobs.py
+#
+# Local background queue for bill OCR. The claim page enqueues stored bills
+# and polls for results instead of blocking on the model. Job state lives in
+# the OcrJobs table, so queued work survives an app restart: a "running"
+# job whose updated_at is older than OCR_JOB_LEASE_SECONDS is treated as
+# abandoned by a dead process and re-queued. Jobs still in flight in
+# another app process or CLI run are left alone.
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from db_utils import backend, get_connection, ensure_schema
+from ocr_cache import get_cached_result
+
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.getenv("OCR_MAX_CONCURRENCY", "4")))
+OCR_JOB_MAX_ATTEMPTS = int(os.getenv("OCR_JOB_MAX_ATTEMPTS", "2"))
+# How long an idle worker waits before checking the table again
+OCR_JOB_POLL_SECONDS = float(os.getenv("OCR_JOB_POLL_SECONDS", "2"))
+# A running job untouched for this long is presumed abandoned; keep it well
+# above ocr_client.OCR_REQUEST_DEADLINE so live requests are never re-run
+OCR_JOB_LEASE_SECONDS = float(os.getenv("OCR_JOB_LEASE_SECONDS", "300"))
+
+PENDING_STATUSES = ("queued", "running")
+
+
+class OcrJob(NamedTuple):
+    id: int
+    filename: str
+    status: str
+    data: Optional[dict]
+    error: Optional[str]
+
+    @property
+    def pending(self) -> bool:
+        return self.status in PENDING_STATUSES
+
+
+def _insert_job(cursor, stored_bill, status, result=None):
+    now = datetime.now()
+    return backend.insert_returning_id(
+        cursor,
+        "OcrJobs",
+        ["image_sha256", "bill_path", "filename", "status", "result_json", "attempts", "created_at", "updated_at"],
+        [stored_bill.digest, stored_bill.path, stored_bill.name, status,
+         json.dumps(result) if result is not None else None, 0, now, now],
+    )
+
+
+def enqueue_bills(stored_bills) -> list:
+    """
+    Queue OCR for bill_store.StoredBill entries and return their job IDs in
+    the same order. Bills with a cached OCR result are recorded as done
+    straight away; a bill already queued or running reuses that job.
+    """
+    ensure_schema()
+    job_ids = []
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for bill in stored_bills:
+            cached = get_cached_result(bill.digest)
+            if cached is not None:
+                job_ids.append(_insert_job(cursor, bill, "done", cached))
+                continue
+            cursor.execute(
+                "SELECT id FROM OcrJobs WHERE image_sha256 = ? AND status IN (?, ?) ORDER BY id DESC",
+                (bill.digest, *PENDING_STATUSES)
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                job_ids.append(int(row[0]))
+            else:
+                job_ids.append(_insert_job(cursor, bill, "queued"))
+        conn.commit()
+    finally:
+        conn.close()
+    get_worker_pool().notify()
+    return job_ids
+
+
+def get_jobs(job_ids) -> list:
+    """
+    Current state of the given jobs, in the order requested.
+    """
+    job_ids = [int(job_id) for job_id in job_ids]
+    if not job_ids:
+        return []
+    get_worker_pool()
+    placeholders = ", ".join("?" for _ in job_ids)
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT id, filename, status, result_json, error FROM OcrJobs WHERE id IN ({placeholders})",
+            tuple(job_ids)
+        )
+        rows = {int(row[0]): row for row in cursor.fetchall()}
+    finally:
+        conn.close()
+    jobs = []
+    for job_id in job_ids:
+        row = rows.get(job_id)
+        if row is None:
+            jobs.append(OcrJob(job_id, "", "missing", None, "job not found"))
+            continue
+        data = json.loads(row[3]) if row[3] else None
+        jobs.append(OcrJob(job_id, row[1], row[2], data, row[4]))
+    return jobs
+
+
+class OcrWorkerPool:
+    """
+    Daemon threads that claim queued OcrJobs rows one at a time and run
+    them through ocr_groq. ocr_client can be swapped for a stub.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, ocr_client=None, lease_seconds: float = OCR_JOB_LEASE_SECONDS):
+        self.workers = max(1, workers)
+        self.ocr_client = ocr_client
+        self.lease_seconds = lease_seconds
+        self._last_recover = 0.0
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        ensure_schema()
+        self.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ocr-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        with self._wake:
+            self._wake.notify_all()
+
+    def recover(self) -> int:
+        """
+        Re-queue running jobs whose lease has expired (their process died
+        mid-request). Returns the number re-queued.
+        """
+        now = datetime.now()
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE OcrJobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now, now - timedelta(seconds=self.lease_seconds))
+            )
+            recovered = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        self._last_recover = time.monotonic()
+        if recovered:
+            print(f"Re-queued {recovered} abandoned OCR jobs")
+        return recovered
+
+    def _claim_next(self):
+        top, limit = backend.limit_clauses(1)
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT {top} id, image_sha256, bill_path FROM OcrJobs WHERE status = 'queued' ORDER BY id {limit}"
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            # Only one worker wins the queued -> running transition
+            cursor.execute(
+                "UPDATE OcrJobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (datetime.now(), row[0])
+            )
+            claimed = cursor.rowcount == 1
+            conn.commit()
+        finally:
+            conn.close()
+        return (int(row[0]), row[1], row[2]) if claimed else self._claim_next()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE OcrJobs SET status = ?, result_json = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, datetime.now(), job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _attempts(self, job_id) -> int:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT attempts FROM OcrJobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        return int(row[0]) if row else OCR_JOB_MAX_ATTEMPTS
+
+    def _run(self):
+        from ocr_groq import _extract_bill_details
+
+        while not self._stop.is_set():
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                print("OCR job queue error:", e)
+                job = None
+            if job is None:
+                if time.monotonic() - self._last_recover >= self.lease_seconds:
+                    # pick up jobs abandoned by a process that died after we started
+                    try:
+                        self.recover()
+                    except Exception as e:
+                        print("OCR job queue error:", e)
+                with self._wake:
+                    self._wake.wait(OCR_JOB_POLL_SECONDS)
+                continue
+
+            job_id, digest, bill_path = job
+            try:
+                with open(bill_path, "rb") as f:
+                    data = f.read()
+                result = _extract_bill_details(data, self.ocr_client, digest)
+                self._finish(job_id, "done", result=result)
+            except Exception as e:
+                print(f"OCR job {job_id} failed:", e)
+                retry = self._attempts(job_id) < OCR_JOB_MAX_ATTEMPTS
+                self._finish(job_id, "queued" if retry else "failed", error=str(e))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(ocr_client=None) -> OcrWorkerPool:
+    """
+    Start the process-wide worker pool on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OcrWorkerPool(ocr_client=ocr_client)
+            _pool.start()
+        return _pool
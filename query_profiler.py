@@ -0,0 +1,287 @@
+# query_profiler.py
+#
+# Opt-in statement profiling (QUERY_PROFILING=1). Statements run through
+# db_utils.engine (pandas reads) are caught by SQLAlchemy cursor events;
+# raw DBAPI connections from db_utils.get_connection() bypass those events,
+# so they are wrapped in a cursor proxy instead. Each statement is recorded
+# with redacted parameters, duration and row count; statements slower than
+# SLOW_QUERY_MS are printed and kept in a separate log.
+#
+# Queries are attributed to the active scopes on the calling thread:
+#
+#   query_profiler.start_rerun("Admin View")   # top of a Streamlit page
+#
+#   with query_profiler.capture() as stats:    # around code under test
+#       load_page()
+#   assert stats.count <= 3
+#   stats.repeated()                           # statements run > once (N+1)
+
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+QUERY_LOG_SIZE = int(os.getenv("QUERY_LOG_SIZE", "500"))
+
+_enabled = QUERY_PROFILING
+_recent = deque(maxlen=QUERY_LOG_SIZE)
+_slow = deque(maxlen=QUERY_LOG_SIZE)
+_reruns = deque(maxlen=50)
+_lock = threading.Lock()
+_local = threading.local()
+
+_IN_LIST = re.compile(r"IN\s*\((\s*\?\s*,?)+\)", re.IGNORECASE)
+
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    """
+    True when profiling is on for the whole process, or forced on for the
+    calling thread by an active capture() block.
+    """
+    return _enabled or getattr(_local, "forced", 0) > 0
+
+
+def normalize(statement: str) -> str:
+    """
+    Collapse whitespace and IN (?, ?, ...) lists so the same query with a
+    different number of IDs counts as one statement.
+    """
+    return _IN_LIST.sub("IN (...)", " ".join(str(statement).split()))
+
+
+def _redact(params):
+    # Keep the shape of the parameters (types / batch size), never the values
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: type(v).__name__ for k, v in params.items()}
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        return f"<{len(params)} rows>"
+    if isinstance(params, (list, tuple)):
+        return tuple(type(v).__name__ for v in params)
+    return type(params).__name__
+
+
+class QueryRecord:
+    __slots__ = ("at", "statement", "params", "duration_ms", "rowcount", "many", "source")
+
+    def __init__(self, statement, params, duration_ms, rowcount, many, source):
+        self.at = datetime.now()
+        self.statement = normalize(statement)
+        self.params = _redact(params)
+        self.duration_ms = duration_ms
+        self.rowcount = rowcount if rowcount is not None and rowcount >= 0 else None
+        self.many = many
+        self.source = source
+
+    @property
+    def slow(self) -> bool:
+        return self.duration_ms >= SLOW_QUERY_MS
+
+    def as_dict(self) -> dict:
+        return {
+            "at": self.at.isoformat(timespec="milliseconds"),
+            "statement": self.statement,
+            "params": self.params,
+            "duration_ms": round(self.duration_ms, 3),
+            "rows": self.rowcount,
+            "executemany": self.many,
+            "source": self.source,
+            "slow": self.slow,
+        }
+
+
+class QueryStats:
+    """
+    Queries seen in one scope (a Streamlit rerun or a capture() block).
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = datetime.now()
+        self.count = 0
+        self.total_ms = 0.0
+        self.slow = 0
+        self.statements = Counter()
+
+    def add(self, record: QueryRecord):
+        self.count += 1
+        self.total_ms += record.duration_ms
+        self.slow += int(record.slow)
+        self.statements[record.statement] += 1
+
+    def repeated(self, at_least: int = 2) -> dict:
+        return {stmt: n for stmt, n in self.statements.most_common() if n >= at_least}
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "started": self.started.isoformat(timespec="seconds"),
+            "queries": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "slow": self.slow,
+            "repeated": self.repeated(),
+        }
+
+
+def _scopes() -> list:
+    scopes = getattr(_local, "scopes", None)
+    if scopes is None:
+        scopes = _local.scopes = []
+    return scopes
+
+
+def _record(statement, params, started, rowcount, many, source):
+    record = QueryRecord(statement, params, (time.perf_counter() - started) * 1000, rowcount, many, source)
+    with _lock:
+        _recent.append(record)
+        if record.slow:
+            _slow.append(record)
+    for scope in _scopes():
+        scope.add(record)
+    if record.slow:
+        print(f"Slow query ({record.duration_ms:.0f} ms, params {record.params}): {record.statement}")
+    return record
+
+
+def start_rerun(label: str) -> QueryStats:
+    """
+    Start counting queries for a new Streamlit rerun on this thread; the
+    previous rerun's scope is dropped and its totals stay in rerun_history().
+    """
+    stats = QueryStats(label)
+    _local.scopes = [stats]
+    if is_enabled():
+        with _lock:
+            _reruns.append(stats)
+    return stats
+
+
+@contextmanager
+def capture(label: str = "capture"):
+    """
+    Count the queries run on this thread inside the block. Profiling is
+    switched on for this thread only, for the duration of the block;
+    captures may be nested.
+    """
+    stats = QueryStats(label)
+    scopes = _scopes()
+    scopes.append(stats)
+    _local.forced = getattr(_local, "forced", 0) + 1
+    try:
+        yield stats
+    finally:
+        _local.forced -= 1
+        scopes.remove(stats)
+
+
+def recent_queries(slow_only: bool = False) -> list:
+    with _lock:
+        return [r.as_dict() for r in (_slow if slow_only else _recent)]
+
+
+def rerun_history() -> list:
+    with _lock:
+        return [s.as_dict() for s in _reruns]
+
+
+def clear():
+    with _lock:
+        _recent.clear()
+        _slow.clear()
+        _reruns.clear()
+
+
+# ---- hooks ---------------------------------------------------------------
+
+def install(engine):
+    """
+    Attach the cursor event listeners to a SQLAlchemy engine. They return
+    immediately while profiling is disabled.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if is_enabled():
+            conn.info.setdefault("query_profiler_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_profiler_started")
+        if started:
+            _record(statement, parameters, started.pop(), getattr(cursor, "rowcount", None), executemany, "engine")
+
+
+class _ProfiledCursor:
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_last", None)
+
+    def execute(self, statement, params=()):
+        started = time.perf_counter()
+        result = self._cursor.execute(statement, params)
+        object.__setattr__(self, "_last", _record(statement, params, started, self._cursor.rowcount, False, "raw"))
+        return result
+
+    def executemany(self, statement, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        started = time.perf_counter()
+        result = self._cursor.executemany(statement, seq_of_params)
+        object.__setattr__(self, "_last", _record(statement, seq_of_params, started, self._cursor.rowcount, True, "raw"))
+        return result
+
+    def _fetched(self, rows):
+        # SELECT row counts are only known once the rows are fetched
+        if self._last is not None:
+            self._last.rowcount = (self._last.rowcount or 0) + rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._fetched(int(row is not None))
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._fetched(len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany set by db_backends.prepare_bulk_cursor
+        setattr(self._cursor, name, value)
+
+
+class _ProfiledConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _ProfiledCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def wrap_connection(conn):
+    """
+    Profile a raw DBAPI connection from the pool; returned unchanged while
+    profiling is disabled.
+    """
+    return _ProfiledConnection(conn) if is_enabled() else conn
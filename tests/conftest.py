@@ -0,0 +1,127 @@
+# conftest.py
+#
+# Tests run against a throwaway SQLite database (DB_BACKEND=sqlite) and
+# bill store, configured before db_utils is first imported. OCR goes
+# through StubOcrClient instead of Groq.
+
+import base64
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+_TMP_DIR = tempfile.mkdtemp(prefix="reimbursement-tests-")
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(_TMP_DIR, "test.db")
+os.environ["BILL_STORE_DIR"] = os.path.join(_TMP_DIR, "bills")
+os.environ["OCR_JOB_POLL_SECONDS"] = "0.05"
+os.environ["METRICS_FILE"] = os.path.join(_TMP_DIR, "metrics.json")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+# Every table the migrations create, emptied between tests
+TABLES = [
+    "EmployeeMaster", "Attendance", "ClaimHistory", "ClaimMembers", "OcrExtractedBills",
+    "OcrResultCache", "OcrJobs", "ClaimMonthlySummary", "BillImageHashes", "BillImageHashBands",
+]
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    from db_utils import ensure_schema, get_connection
+    from ocr_cache import clear_memory_cache
+
+    ensure_schema()
+    yield
+    clear_memory_cache()
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for table in TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_TMP_DIR, ignore_errors=True)
+
+
+class StubOcrClient:
+    """
+    Stands in for ocr_client.ResilientOcrClient. The "bill" bytes are
+    echoed back as the bill number after `latency` seconds (or
+    latency(data) for per-bill delays); bills listed in `fail` always
+    raise, those in `flaky` raise on their first request only. Tracks how
+    many requests ran at once.
+    """
+
+    def __init__(self, latency=0.0, fail=(), flaky=()):
+        self.latency = latency
+        self.fail = {bytes(f) for f in fail}
+        self.flaky = {bytes(f) for f in flaky}
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, model, **kwargs):
+        url = messages[0]["content"][1]["image_url"]["url"]
+        data = base64.b64decode(url.split(",", 1)[1])
+        with self._lock:
+            self.calls.append(data)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.latency(data) if callable(self.latency) else self.latency)
+            if data in self.fail or data in self.flaky:
+                with self._lock:
+                    self.flaky.discard(data)
+                raise RuntimeError(f"stub OCR failure for {data.decode()}")
+            content = json.dumps({
+                "restaurant_name": "Stub Diner",
+                "bill_number": data.decode(),
+                "date": "01/09/26",
+                "total": 100.0,
+            })
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def stub_ocr():
+    return StubOcrClient
+
+
+def _make_claim(bill_number, claimant="E1", order_date="2026-09-01", amount=100.0, status="Pending", members=None):
+    members = members or [{"id": claimant, "name": claimant}]
+    return {
+        "Order Date": order_date,
+        "Claim Date": order_date,
+        "Claimant ID": claimant,
+        "Group Members": json.dumps(members),
+        "Bill Amount": amount,
+        "Reimbursed Amount": amount,
+        "Bill Number": bill_number,
+        "Bill File": "",
+        "Status": status,
+    }
+
+
+@pytest.fixture
+def make_claim():
+    """
+    Build a claim dict for db_utils.append_claim_records.
+    """
+    return _make_claim
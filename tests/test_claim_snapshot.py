@@ -0,0 +1,85 @@
+# test_claim_snapshot.py
+
+import pandas as pd
+from db_utils import append_claim_records, update_claim_statuses, get_connection, query_claims
+from claim_snapshot import ClaimSnapshot
+
+
+def _page(snapshot):
+    return snapshot.get_page("all", lambda: query_claims(order_by="Order Date"), lambda df: df)
+
+
+def _stamp(bill_number, stamp):
+    conn = get_connection()
+    try:
+        conn.cursor().execute(
+            "UPDATE ClaimHistory SET [Status] = 'Approved', [Last Modified] = ? WHERE [Bill Number] = ?",
+            (stamp, bill_number)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_status_change_is_merged_into_cached_page(make_claim):
+    append_claim_records([make_claim("B1"), make_claim("B2")])
+    snapshot = ClaimSnapshot()
+    _page(snapshot)
+
+    update_claim_statuses({"B1": "Approved"})
+    page, _ = _page(snapshot)
+    assert page.set_index("Bill Number").loc["B1", "Status"] == "Approved"
+
+
+def test_late_commit_below_watermark_is_not_lost(make_claim):
+    append_claim_records([make_claim("B1"), make_claim("B2")])
+    snapshot = ClaimSnapshot(overlap=60)
+    _page(snapshot)
+    update_claim_statuses({"B2": "Rejected"})
+    _page(snapshot)
+
+    # a transaction stamped before the watermark commits only now
+    earlier = (snapshot.watermark - pd.Timedelta(seconds=5)).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    _stamp("B1", earlier)
+    page, _ = _page(snapshot)
+    assert page.set_index("Bill Number").loc["B1", "Status"] == "Approved"
+
+
+def test_rows_in_overlap_are_merged_once(make_claim):
+    append_claim_records([make_claim("B1")])
+    snapshot = ClaimSnapshot(overlap=60)
+    _page(snapshot)
+    update_claim_statuses({"B1": "Approved"})
+
+    assert snapshot.refresh(lambda df: df) == 1
+    assert snapshot.refresh(lambda df: df) == 0
+
+
+def test_row_entering_a_status_filter_reloads_that_page(make_claim):
+    append_claim_records([make_claim("B1"), make_claim("B2", status="Approved")])
+    snapshot = ClaimSnapshot()
+
+    def approved_page():
+        page, _ = snapshot.get_page(
+            "approved", lambda: query_claims(statuses=["Approved"], order_by="Order Date"), lambda df: df,
+            statuses=["Approved"],
+        )
+        return sorted(page["Bill Number"])
+
+    _page(snapshot)
+    assert approved_page() == ["B2"]
+
+    update_claim_statuses({"B1": "Approved"})
+    _page(snapshot)
+    assert approved_page() == ["B1", "B2"]
+
+
+def test_row_leaving_a_status_filter_reloads_that_page(make_claim):
+    append_claim_records([make_claim("B1", status="Approved"), make_claim("B2", status="Approved")])
+    snapshot = ClaimSnapshot()
+    loader = lambda: query_claims(statuses=["Approved"], order_by="Order Date")
+    snapshot.get_page("approved", loader, lambda df: df, statuses=["Approved"])
+
+    update_claim_statuses({"B1": "Rejected"})
+    page, _ = snapshot.get_page("approved", loader, lambda df: df, statuses=["Approved"])
+    assert page["Bill Number"].tolist() == ["B2"]
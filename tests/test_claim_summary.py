@@ -0,0 +1,76 @@
+# test_claim_summary.py
+
+import threading
+from claim_summary import load_monthly_summary, rebuild_monthly_summary
+from db_utils import append_claim_records, update_claim_statuses, get_connection
+
+
+def _employees():
+    conn = get_connection()
+    try:
+        conn.cursor().executemany(
+            "INSERT INTO EmployeeMaster ([Employee ID], [Employee Name], [Project], [Reporting Manager]) "
+            "VALUES (?, ?, ?, ?)",
+            [("E1", "Asha", "Apollo", "Ravi"), ("E2", "Ben", "Apollo", "Ravi"), ("E3", "Chen", "Gemini", "Mira")]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_incremental_summary_matches_rebuild(make_claim):
+    _employees()
+    append_claim_records([make_claim("B1", "E1"), make_claim("B2", "E2", amount=50.0), make_claim("B3", "E3", "2026-10-02")])
+    append_claim_records([make_claim("B4", "E1", "2026-10-05")])
+    update_claim_statuses({"B1": "Approved", "B3": "Rejected"})
+
+    incremental = load_monthly_summary(statuses=None)
+    rebuild_monthly_summary()
+    assert incremental.equals(load_monthly_summary(statuses=None))
+
+    approved = load_monthly_summary(statuses=["Approved"])
+    assert approved[["Month", "Project", "Claims", "Bill Amount"]].values.tolist() == [["2026-09", "Apollo", 1, 100.0]]
+
+
+def test_concurrent_claims_share_a_new_bucket(make_claim):
+    _employees()
+    errors = []
+
+    def submit(i):
+        try:
+            append_claim_records([make_claim(f"C{i}", "E1", "2026-11-03")])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    summary = load_monthly_summary("2026-11", "2026-11")
+    assert summary["Claims"].tolist() == [8]
+
+
+def test_concurrent_status_changes_keep_summary_consistent(make_claim):
+    _employees()
+    append_claim_records([make_claim(f"S{i}", "E1") for i in range(4)])
+    errors = []
+
+    def change(status):
+        try:
+            update_claim_statuses({f"S{i}": status for i in range(4)})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=change, args=(status,)) for status in ["Approved", "Rejected"] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    incremental = load_monthly_summary(statuses=None)
+    rebuild_monthly_summary()
+    assert incremental.equals(load_monthly_summary(statuses=None))
@@ -0,0 +1,55 @@
+# test_export_claims.py
+
+import json
+import pandas as pd
+import pytest
+from db_utils import get_connection
+from export_claims import export_claims
+
+
+def _insert(rows):
+    conn = get_connection()
+    try:
+        conn.cursor().executemany(
+            "INSERT INTO ClaimHistory ([Order Date], [Claim Date], [Claimant ID], [Group Members], "
+            "[Bill Amount], [Reimbursed Amount], [Bill Number], [Status]) VALUES (?, ?, ?, ?, ?, ?, ?, 'Pending')",
+            [("2026-09-01", "2026-09-02", "E1", members, 200.0, 200.0, bill) for bill, members in rows]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+MEMBERS = [{"id": "E1", "name": "Joseph D'Souza"}, {"id": "E2", "name": "Ann O'Neil"}]
+
+
+@pytest.fixture
+def claims():
+    _insert([
+        ("B1", json.dumps(MEMBERS)),
+        ("B2", str([{"id": "E3", "name": "Ravi"}])),  # legacy single-quoted row
+        ("B3", "not json"),
+    ])
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_apostrophes_and_unparsable_members(tmp_path, claims, suffix):
+    path = str(tmp_path / f"claims{suffix}")
+    unparsed = []
+    assert export_claims(path, unparsed=unparsed) == 3
+
+    df = pd.read_csv(path, dtype={"Member IDs": str}) if suffix == ".csv" else pd.read_parquet(path)
+    rows = df.set_index("Bill Number")
+    assert rows.loc["B1", "Member Count"] == 2
+    assert rows.loc["B1", "Member Names"] == "Joseph D'Souza;Ann O'Neil"
+    assert rows.loc["B2", "Member IDs"] == "E3"
+    assert pd.isna(rows.loc["B3", "Member Count"])
+    assert unparsed == ["B3"]
+
+
+def test_explode_members(tmp_path, claims):
+    path = str(tmp_path / "members.csv")
+    assert export_claims(path, explode_members=True) == 4
+
+    df = pd.read_csv(path)
+    assert df.loc[df["Bill Number"] == "B1", "Member Name"].tolist() == ["Joseph D'Souza", "Ann O'Neil"]
@@ -0,0 +1,52 @@
+# test_import_claims.py
+
+import pandas as pd
+from db_utils import get_connection
+from employee_directory import EmployeeDirectory
+from import_claims import validate_batch
+
+
+def _setup(ids, order_date="2026-09-01"):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO EmployeeMaster ([Employee ID], [Employee Name], [Project], [Reporting Manager]) "
+            "VALUES (?, ?, ?, ?)",
+            [(emp_id, emp_id, "Apollo", "Ravi") for emp_id in ids]
+        )
+        cursor.executemany(
+            "INSERT INTO Attendance ([Employee ID], [Date], [Status]) VALUES (?, ?, 'Present')",
+            [(emp_id, order_date) for emp_id in ids]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return EmployeeDirectory(pd.DataFrame({"Employee ID": ids, "Employee Name": ids}))
+
+
+def _batch(rows):
+    return pd.DataFrame([
+        {"Order Date": "2026-09-01", "Claim Date": "2026-09-01", "Claimant ID": members.split(";")[0],
+         "Group Members": members, "Bill Amount": "100", "Bill Number": bill}
+        for bill, members in rows
+    ])
+
+
+def test_rejected_rows_do_not_block_later_rows():
+    employees = _setup(["E1", "E2", "E3"])
+    batch = _batch([("B1", "E1;E2"), ("B2", "E2;E3"), ("B3", "E3")])
+
+    claims, errors = validate_batch(batch, employees, set())
+    # B2 clashes with B1 on E2; B3 only shares E3 with the rejected B2
+    assert [claim["Bill Number"] for claim in claims] == ["B1", "B3"]
+    assert list(errors) == [1]
+    assert errors[1] == ["E2 appears in another claim on 2026-09-01 in this file"]
+
+
+def test_member_repeated_within_a_row_is_not_a_duplicate():
+    employees = _setup(["E1"])
+    claims, errors = validate_batch(_batch([("B1", "E1;E1")]), employees, set())
+
+    assert errors == {}
+    assert len(claims) == 1
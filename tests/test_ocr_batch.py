@@ -0,0 +1,62 @@
+# test_ocr_batch.py
+
+import pytest
+from ocr_groq import extract_bill_details_batch
+
+
+class FakeUpload:
+    def __init__(self, name, data):
+        self.name = name
+        self._data = data
+
+    def getvalue(self):
+        return self._data
+
+
+def _uploads(n, prefix="bill"):
+    return [FakeUpload(f"{prefix}-{i}.jpg", f"{prefix}-{i}".encode()) for i in range(n)]
+
+
+def test_results_keep_upload_order(stub_ocr):
+    # earlier uploads take longest, so they finish last
+    client = stub_ocr(latency=lambda data: 0.05 * (5 - int(data.decode().rsplit("-", 1)[1])))
+    results = extract_bill_details_batch(_uploads(5, "order"), max_workers=5, ocr_client=client)
+
+    assert [r.filename for r in results] == [f"order-{i}.jpg" for i in range(5)]
+    assert [r.data["bill_number"] for r in results] == [f"order-{i}" for i in range(5)]
+    assert all(r.error is None for r in results)
+
+
+def test_failed_file_is_reported_without_affecting_others(stub_ocr):
+    client = stub_ocr(latency=0.01, fail=[b"partial-1"])
+    results = extract_bill_details_batch(_uploads(3, "partial"), ocr_client=client)
+
+    assert results[1].data is None
+    assert "stub OCR failure for partial-1" in results[1].error
+    assert [r.data["bill_number"] for r in (results[0], results[2])] == ["partial-0", "partial-2"]
+    assert results[0].error is None and results[2].error is None
+
+
+@pytest.mark.parametrize("cap", [1, 3])
+def test_concurrency_is_capped(stub_ocr, cap):
+    client = stub_ocr(latency=0.05)
+    results = extract_bill_details_batch(_uploads(8, f"cap{cap}"), max_workers=cap, ocr_client=client)
+
+    assert len(client.calls) == 8
+    assert all(r.error is None for r in results)
+    assert client.peak <= cap
+    if cap > 1:
+        assert client.peak > 1
+
+
+def test_identical_bills_are_sent_once(stub_ocr):
+    client = stub_ocr()
+    first = extract_bill_details_batch([FakeUpload("a.jpg", b"same")], ocr_client=client)
+    second = extract_bill_details_batch([FakeUpload("b.jpg", b"same")], ocr_client=client)
+
+    assert len(client.calls) == 1
+    assert first[0].data == second[0].data
+
+
+def test_empty_batch():
+    assert extract_bill_details_batch([]) == []
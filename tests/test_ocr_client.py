@@ -0,0 +1,95 @@
+# test_ocr_client.py
+
+import time
+from types import SimpleNamespace
+import pytest
+from ocr_client import CircuitBreaker, CircuitOpenError, OcrDeadlineExceeded, ResilientOcrClient
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedClient:
+    """
+    Raises or returns the scripted outcomes in order, then returns "ok".
+    """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **kwargs):
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def _client(scripted, **kwargs):
+    options = dict(rate_per_minute=60000, burst=100, max_retries=0, backoff_base=0, deadline=5,
+                   breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05))
+    options.update(kwargs)
+    return ResilientOcrClient(scripted, **options)
+
+
+def test_transient_error_is_retried():
+    client = _client(ScriptedClient(StatusError(503), StatusError(429)), max_retries=2,
+                     breaker=CircuitBreaker(failure_threshold=5, reset_timeout=1))
+
+    assert client.create(model="m", messages=[]) == "ok"
+    assert client.stats()["retries"] == 2
+    assert client.stats()["throttled"] == 1
+
+
+def test_breaker_opens_and_rejects_calls():
+    client = _client(ScriptedClient(StatusError(503)))
+    with pytest.raises(StatusError):
+        client.create(model="m", messages=[])
+    with pytest.raises(CircuitOpenError):
+        client.create(model="m", messages=[])
+    assert client.stats()["breaker_state"] == "open"
+
+
+@pytest.mark.parametrize("trial_error", [StatusError(400), StatusError(404)])
+def test_provider_answer_in_trial_closes_breaker(trial_error):
+    client = _client(ScriptedClient(StatusError(503), trial_error))
+    with pytest.raises(StatusError):
+        client.create(model="m", messages=[])
+    time.sleep(0.06)
+
+    with pytest.raises(StatusError):
+        client.create(model="m", messages=[])
+    assert client.breaker.state == "closed"
+    assert client.create(model="m", messages=[]) == "ok"
+
+
+def test_trial_without_answer_reopens_breaker():
+    client = _client(ScriptedClient(StatusError(503), ValueError("bad payload")))
+    with pytest.raises(StatusError):
+        client.create(model="m", messages=[])
+    time.sleep(0.06)
+
+    with pytest.raises(ValueError):
+        client.create(model="m", messages=[])
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        client.create(model="m", messages=[])
+
+    time.sleep(0.06)
+    assert client.create(model="m", messages=[]) == "ok"
+    assert client.breaker.state == "closed"
+
+
+def test_trial_deadline_while_rate_limited_reopens_breaker():
+    client = _client(ScriptedClient(StatusError(503)), rate_per_minute=1, burst=1, deadline=0.01)
+    with pytest.raises(StatusError):
+        client.create(model="m", messages=[])
+    time.sleep(0.06)
+
+    # the only token was spent, so the trial can't be sent before its deadline
+    with pytest.raises(OcrDeadlineExceeded):
+        client.create(model="m", messages=[])
+    assert client.breaker.state == "open"
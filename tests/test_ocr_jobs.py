@@ -0,0 +1,141 @@
+# test_ocr_jobs.py
+
+import time
+from datetime import datetime, timedelta
+import pytest
+import ocr_jobs
+from bill_store import store_bill
+from db_utils import get_connection
+from ocr_cache import store_result
+from ocr_jobs import OcrWorkerPool, enqueue_bills, get_jobs
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    """
+    Install a worker pool with a stub OCR client as the process-wide pool
+    (so enqueue_bills never starts one backed by Groq). Started on request.
+    """
+    pools = []
+
+    def make(client, workers=2, start=True, lease_seconds=300):
+        pool = OcrWorkerPool(workers=workers, ocr_client=client, lease_seconds=lease_seconds)
+        monkeypatch.setattr(ocr_jobs, "_pool", pool)
+        if start:
+            pool.start()
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.stop(timeout=5)
+
+
+def _bills(*names):
+    return [store_bill(name.encode(), f"{name}.jpg") for name in names]
+
+
+def _wait(job_ids, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        jobs = get_jobs(job_ids)
+        if not any(job.pending for job in jobs) or time.monotonic() > deadline:
+            return jobs
+        time.sleep(0.02)
+
+
+def _job_row(job_id):
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, attempts, error FROM OcrJobs WHERE id = ?", (job_id,))
+        return tuple(cursor.fetchone())
+    finally:
+        conn.close()
+
+
+def _set_running(job_id, updated_at):
+    conn = get_connection()
+    try:
+        conn.cursor().execute(
+            "UPDATE OcrJobs SET status = 'running', attempts = 1, updated_at = ? WHERE id = ?", (updated_at, job_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_enqueued_bills_are_processed_in_order(stub_ocr, make_pool):
+    client = stub_ocr(latency=0.01)
+    make_pool(client)
+    job_ids = enqueue_bills(_bills("job-a", "job-b", "job-c"))
+
+    jobs = _wait(job_ids)
+    assert [job.status for job in jobs] == ["done"] * 3
+    assert [job.data["bill_number"] for job in jobs] == ["job-a", "job-b", "job-c"]
+    assert [job.filename for job in jobs] == ["job-a.jpg", "job-b.jpg", "job-c.jpg"]
+
+
+def test_cached_and_pending_bills_are_not_queued_twice(stub_ocr, make_pool):
+    client = stub_ocr()
+    make_pool(client, start=False)
+    cached, fresh = _bills("cached", "fresh")
+    store_result(cached.digest, {"bill_number": "from-cache"})
+
+    first = enqueue_bills([cached, fresh])
+    second = enqueue_bills([fresh])
+
+    assert get_jobs(first)[0].status == "done"
+    assert get_jobs(first)[0].data == {"bill_number": "from-cache"}
+    assert second == [first[1]]
+    assert client.calls == []
+
+
+def test_claim_moves_one_job_to_running(stub_ocr, make_pool):
+    pool = make_pool(stub_ocr(), start=False)
+    job_id, = enqueue_bills(_bills("claim-me"))
+
+    assert pool._claim_next()[0] == job_id
+    assert _job_row(job_id)[:2] == ("running", 1)
+    assert pool._claim_next() is None
+
+
+def test_failed_request_is_retried(stub_ocr, make_pool):
+    client = stub_ocr(flaky=[b"flaky"])
+    make_pool(client, workers=1)
+    job_id, = enqueue_bills(_bills("flaky"))
+
+    job, = _wait([job_id])
+    assert job.status == "done"
+    assert job.data["bill_number"] == "flaky"
+    assert _job_row(job_id)[1] == 2
+    assert client.calls == [b"flaky", b"flaky"]
+
+
+def test_job_fails_after_max_attempts(stub_ocr, make_pool):
+    client = stub_ocr(fail=[b"broken"])
+    make_pool(client, workers=1)
+    job_id, = enqueue_bills(_bills("broken"))
+
+    job, = _wait([job_id])
+    status, attempts, error = _job_row(job_id)
+    assert job.status == status == "failed"
+    assert attempts == ocr_jobs.OCR_JOB_MAX_ATTEMPTS
+    assert "stub OCR failure for broken" in error
+    assert len(client.calls) == ocr_jobs.OCR_JOB_MAX_ATTEMPTS
+
+
+def test_restart_requeues_only_abandoned_jobs(stub_ocr, make_pool):
+    client = stub_ocr()
+    pool = make_pool(client, start=False, lease_seconds=60)
+    abandoned, in_flight = enqueue_bills(_bills("abandoned", "in-flight"))
+    # one left running by a dead process, one still running in another process
+    _set_running(abandoned, datetime.now() - timedelta(minutes=5))
+    _set_running(in_flight, datetime.now())
+
+    pool.start()
+    jobs = _wait([abandoned], timeout=5)
+
+    assert jobs[0].status == "done"
+    assert _job_row(in_flight)[0] == "running"
+    assert client.calls == [b"abandoned"]
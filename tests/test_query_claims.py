@@ -0,0 +1,34 @@
+# test_query_claims.py
+
+from db_utils import append_claim_records, get_connection, query_claims
+
+
+def _all_pages(**kwargs):
+    seen, after = [], None
+    while True:
+        page, after = query_claims(page_size=2, after=after, **kwargs)
+        seen.extend(page["Claim ID"].tolist())
+        if after is None:
+            return seen
+
+
+def test_pages_do_not_skip_rows_sharing_sort_key_and_bill_number(make_claim):
+    append_claim_records([make_claim(""), make_claim(""), make_claim("")])
+
+    ids = _all_pages(order_by="Order Date")
+    assert len(ids) == 3
+    assert len(set(ids)) == 3
+
+
+def test_null_amounts_are_paged(make_claim):
+    append_claim_records([make_claim("B1"), make_claim("B2"), make_claim("B3")])
+    conn = get_connection()
+    try:
+        conn.cursor().execute("UPDATE ClaimHistory SET [Reimbursed Amount] = NULL WHERE [Bill Number] <> 'B2'")
+        conn.commit()
+    finally:
+        conn.close()
+
+    for descending in (True, False):
+        ids = _all_pages(order_by="Reimbursed Amount", descending=descending)
+        assert len(set(ids)) == 3
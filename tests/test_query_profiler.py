@@ -0,0 +1,56 @@
+# test_query_profiler.py
+
+import threading
+import query_profiler
+from db_utils import append_claim_records, check_attendance_bulk, find_already_claimed, load_employee_data
+
+
+def test_group_checks_use_one_query_per_chunk():
+    ids = [f"E{i}" for i in range(1200)]
+    with query_profiler.capture() as stats:
+        check_attendance_bulk(ids, "2026-09-01")
+        find_already_claimed(ids, "2026-09-01")
+
+    # 500 IDs per IN list
+    assert stats.count == 6
+    assert len(stats.statements) == 2
+
+
+def test_claim_insert_query_count_does_not_grow_with_batch_size(make_claim):
+    def claims(n, prefix):
+        return [make_claim(f"{prefix}-bill-{i}", f"{prefix}{i}") for i in range(n)]
+
+    append_claim_records(claims(1, "warm-up"))  # creates the monthly summary bucket
+    with query_profiler.capture() as one:
+        append_claim_records(claims(1, "one"))
+    with query_profiler.capture() as many:
+        append_claim_records(claims(40, "many"))
+
+    assert many.count == one.count
+    assert not many.repeated()
+
+
+def test_engine_reads_are_counted():
+    with query_profiler.capture() as stats:
+        load_employee_data()
+    # pandas may also probe whether the string is a table name
+    assert stats.statements["SELECT * FROM EmployeeMaster"] == 1
+
+
+def test_capture_only_profiles_its_own_thread():
+    seen = {}
+
+    def other_thread():
+        seen["enabled"] = query_profiler.is_enabled()
+
+    with query_profiler.capture():
+        with query_profiler.capture() as inner:
+            load_employee_data()
+        assert query_profiler.is_enabled()
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+
+    assert inner.statements["SELECT * FROM EmployeeMaster"] == 1
+    assert seen["enabled"] is query_profiler.QUERY_PROFILING
+    assert query_profiler.is_enabled() is query_profiler.QUERY_PROFILING
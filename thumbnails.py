@@ -0,0 +1,79 @@
+# thumbnails.py
+
+import base64
+import hashlib
+import io
+import os
+from functools import lru_cache
+from image_prep import detect_mime
+from metrics import span
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # without Pillow the full image is embedded instead
+    Image = None
+    ImageOps = None
+
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "data/thumbnails")
+# Longest edge of a generated thumbnail, in pixels
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "160"))
+
+
+def split_bill_paths(path_str) -> list:
+    """
+    Split a "Bill File" value into absolute file paths.
+    """
+    if not path_str or str(path_str).strip().upper() in ("N/A", "NONE", "NAN", ""):
+        return []
+    paths = [p.strip().replace("\\", "/") for p in str(path_str).split(",") if p.strip()]
+    return [p if os.path.isabs(p) else os.path.join(os.getcwd(), p) for p in paths]
+
+
+def _data_uri(data: bytes) -> str:
+    return f"data:{detect_mime(data)};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+@lru_cache(maxsize=4096)
+@span("thumbnail.encode")
+def _thumbnail_uri(full_path: str, mtime_ns: int, size: int) -> str:
+    if Image is None:
+        with open(full_path, "rb") as f:
+            return _data_uri(f.read())
+
+    key = hashlib.sha1(f"{full_path}|{mtime_ns}|{size}".encode("utf-8")).hexdigest()
+    thumb_path = os.path.join(THUMBNAIL_DIR, key[:2], f"{key}.jpg")
+    if not os.path.exists(thumb_path):
+        with Image.open(full_path) as img:
+            thumb = ImageOps.exif_transpose(img).convert("RGB")
+            thumb.thumbnail((size, size))
+            buffer = io.BytesIO()
+            thumb.save(buffer, format="JPEG", quality=70, optimize=True)
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp_path = f"{thumb_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, thumb_path)
+
+    with open(thumb_path, "rb") as f:
+        return _data_uri(f.read())
+
+
+def thumbnail_data_uri(full_path: str) -> str:
+    """
+    Data URI of a small thumbnail for the image at full_path, generated
+    once and cached on disk keyed by path and mtime. "" if unavailable.
+    """
+    try:
+        stat = os.stat(full_path)
+        return _thumbnail_uri(full_path, stat.st_mtime_ns, THUMBNAIL_SIZE)
+    except Exception:
+        return ""
+
+
+def thumbnails_for_bill_files(path_str) -> str:
+    """
+    Thumbnails for every file in a "Bill File" value, joined with "|".
+    """
+    uris = (thumbnail_data_uri(p) for p in split_bill_paths(path_str))
+    return "|".join(uri for uri in uris if uri)